@@ -29,6 +29,12 @@ download_weights() {
     else
         echo "${weights_file} already exists, skipping download"
     fi
+
+    # Memory-mapped safetensors copy for fast startup and shared weight pages
+    if [ ! -f "${weights_path%.pth}.safetensors" ]; then
+        python -m src.depth_estimation.weights "$weights_path" \
+            || echo "Could not convert ${weights_file}, loading the .pth instead"
+    fi
 }
 
 # Download all model weights
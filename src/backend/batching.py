@@ -0,0 +1,123 @@
+# src/backend/batching.py
+
+import asyncio
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from loguru import logger
+
+
+class QueueFullError(Exception):
+    """Raised when a scheduler already holds `max_queue_size` requests."""
+
+
+class BatchScheduler:
+    """
+    Coalesce concurrent requests into batches.
+
+    Requests are grouped by `key_fn(item)` (e.g. the network input shape, so a
+    group can be stacked into one tensor). A group is flushed as soon as it
+    holds `max_batch_size` items or `max_wait_ms` after its first item
+    arrived, whichever comes first. `infer_fn` receives the list of items of
+    one group and must return one result per item, in order.
+
+    At most `max_queue_size` requests may be waiting or running at once;
+    further submissions raise `QueueFullError` so callers can shed load.
+
+    Batches run on `executor` (an `InferenceExecutor`) when given, otherwise
+    on the event loop's default thread pool.
+    """
+
+    def __init__(
+        self,
+        infer_fn: Callable[[List[Any]], List[Any]],
+        key_fn: Optional[Callable[[Any], Hashable]] = None,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_queue_size: int = 64,
+        executor=None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+
+        self.infer_fn = infer_fn
+        self.key_fn = key_fn or (lambda item: None)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+        self.executor = executor
+
+        self._pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks = set()
+        self._in_flight = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests currently waiting or being processed."""
+        return self._in_flight
+
+    async def submit(self, item: Any) -> Any:
+        if self._in_flight >= self.max_queue_size:
+            raise QueueFullError(
+                f"Batch queue is full ({self.max_queue_size} requests in flight)."
+            )
+
+        key = self.key_fn(item)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        self._in_flight += 1
+        try:
+            group = self._pending.setdefault(key, [])
+            group.append((item, future))
+
+            if len(group) >= self.max_batch_size:
+                self._flush(key)
+            elif len(group) == 1:
+                self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+
+            return await future
+        finally:
+            self._in_flight -= 1
+
+    def _flush(self, key: Hashable) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        group = self._pending.pop(key, None)
+        if not group:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._run(group))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, group: List[Tuple[Any, asyncio.Future]]) -> None:
+        items = [item for item, _ in group]
+        logger.debug(f"Running batch of {len(items)} request(s)")
+
+        try:
+            if self.executor is not None:
+                results = await self.executor.run(self.infer_fn, items)
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    None, self.infer_fn, items
+                )
+        except Exception as e:
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(group, results):
+            if not future.done():
+                future.set_result(result)
+
+        if len(results) < len(group):
+            # Never leave a request waiting on a result that will not come
+            logger.error(f"Batch of {len(group)} item(s) returned {len(results)} result(s)")
+            error = RuntimeError("Inference returned no result for this item.")
+            for _, future in group[len(results) :]:
+                if not future.done():
+                    future.set_exception(error)
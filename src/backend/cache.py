@@ -0,0 +1,233 @@
+# src/backend/cache.py
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+
+from src.backend.singleflight import SingleFlight
+
+
+@dataclass
+class CacheEntry:
+    """A cached response body plus what is needed to rebuild the response."""
+
+    data: bytes
+    media_type: str
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of encoded results.
+
+    Keys are built with `make_key` from the upload bytes and everything that
+    affects the output (model, input size, output format, ...). Entries live
+    in an in-memory LRU bounded by `max_bytes`; when `disk_dir` is set,
+    evicted and new entries are also written there (bounded by
+    `disk_max_bytes`, oldest files removed first) and promoted back to memory
+    on a hit. Disk reads and writes run on the threadpool, and the disk size
+    is tracked as files are written and removed, so the event loop never
+    scans the directory.
+
+    `get_or_compute` deduplicates concurrent misses for the same key: only
+    the first caller computes, the others await its result.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        disk_dir: Optional[str | Path] = None,
+        disk_max_bytes: Optional[int] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Cache files this process knows of, oldest first, with their sizes
+        self._disk_files: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+        self._disk_lock = threading.Lock()
+
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._index_disk()
+
+    @staticmethod
+    def make_key(data: bytes, *parts) -> str:
+        digest = hashlib.sha256(data)
+        for part in parts:
+            digest.update(b"\0" + str(part).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Entry for `key` from memory or disk (blocking; see `get_or_compute`)."""
+        entry = self._get_memory(key)
+        if entry is None:
+            entry = self._load_disk(key)
+        return entry
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        """Store an entry in memory and on disk (blocking; see `get_or_compute`)."""
+        self._put_memory(key, entry)
+        self._write_disk(key, entry)
+
+    async def get_or_compute(
+        self, key: str, compute: Callable[[], Awaitable[CacheEntry]]
+    ) -> tuple[CacheEntry, bool]:
+        """Cached entry for `key`, computing it on a miss. Returns (entry, hit)."""
+        entry = self._get_memory(key)
+        if entry is not None:
+            return entry, True
+
+        async def load() -> tuple[CacheEntry, bool]:
+            if self.disk_dir is not None:
+                entry = await run_in_threadpool(self._load_disk, key)
+                if entry is not None:
+                    return entry, True
+
+            self.misses += 1
+            entry = await compute()
+            self._put_memory(key, entry)
+            if self.disk_dir is not None:
+                await run_in_threadpool(self._write_disk, key, entry)
+            return entry, False
+
+        (entry, hit), coalesced = await self._flights.run(key, load)
+        return entry, hit or coalesced
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self._flights.coalesced,
+            "evictions": self.evictions,
+        }
+
+    def _get_memory(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return entry
+
+    def _load_disk(self, key: str) -> Optional[CacheEntry]:
+        entry = self._read_disk(key)
+        if entry is not None:
+            self.disk_hits += 1
+            self._put_memory(key, entry)
+        return entry
+
+    def _put_memory(self, key: str, entry: CacheEntry) -> None:
+        if entry.nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous.nbytes
+
+            self._entries[key] = entry
+            self._size += entry.nbytes
+
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+                self.evictions += 1
+
+    def _paths(self, key: str):
+        return self.disk_dir / f"{key}.bin", self.disk_dir / f"{key}.json"
+
+    def _index_disk(self) -> None:
+        """Pick up files left by earlier runs, once, at startup."""
+        files = []
+        for path in self.disk_dir.glob("*.bin"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+
+        for _, key, size in sorted(files):
+            self._disk_files[key] = size
+            self._disk_size += size
+
+    def _read_disk(self, key: str) -> Optional[CacheEntry]:
+        if self.disk_dir is None:
+            return None
+
+        data_path, meta_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text())
+            entry = CacheEntry(
+                data_path.read_bytes(), meta["media_type"], meta.get("headers", {})
+            )
+            os.utime(data_path)
+        except (OSError, ValueError, KeyError, TypeError):
+            # Missing, half-written, from an older format or removed by another process
+            return None
+
+        with self._disk_lock:
+            if key in self._disk_files:
+                self._disk_files.move_to_end(key)
+        return entry
+
+    def _write_disk(self, key: str, entry: CacheEntry) -> None:
+        if self.disk_dir is None:
+            return
+        if self.disk_max_bytes and entry.nbytes > self.disk_max_bytes:
+            # It would evict every other file and then itself
+            return
+
+        data_path, meta_path = self._paths(key)
+        try:
+            data_path.write_bytes(entry.data)
+            meta_path.write_text(
+                json.dumps({"media_type": entry.media_type, "headers": entry.headers})
+            )
+        except OSError as e:
+            logger.warning(f"Could not write cache entry to disk: {e}")
+            return
+
+        with self._disk_lock:
+            self._disk_size += entry.nbytes - self._disk_files.pop(key, 0)
+            self._disk_files[key] = entry.nbytes
+
+            evicted = []
+            while self.disk_max_bytes and self._disk_size > self.disk_max_bytes:
+                old_key, size = self._disk_files.popitem(last=False)
+                self._disk_size -= size
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            for path in self._paths(old_key):
+                try:
+                    path.unlink(missing_ok=True)
+                except OSError as e:
+                    logger.warning(f"Could not remove cache file {path}: {e}")
@@ -0,0 +1,114 @@
+# src/backend/config.py
+
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _env_shapes(name: str) -> list:
+    """"480x640,720x1280" -> [(480, 640), (720, 1280)] as (height, width)."""
+    shapes = []
+    for item in os.getenv(name, "").split(","):
+        if item.strip():
+            height, width = item.lower().split("x")
+            shapes.append((int(height), int(width)))
+    return shapes
+
+
+# Models this deployment serves, e.g. "depth" for depth-only replicas
+# (default: every registered model); loaded lazily, or in the background at
+# startup when MODEL_WARMUP is set
+SERVED_MODELS = [
+    name.strip() for name in os.getenv("SERVED_MODELS", "").split(",") if name.strip()
+] or None
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+# Least recently used models are unloaded to stay under this (0: no limit)
+MODEL_MEMORY_BUDGET_BYTES = _env_int("MODEL_MEMORY_BUDGET_MB", 0) * 1024 * 1024 or None
+
+# Depth model variants that /predict can select with ?model=; the default
+# one is warmed up at startup, the others load on first use. Only list
+# variants whose weights are present (entrypoint.sh downloads vits only).
+DEPTH_VARIANTS = [
+    name.strip() for name in os.getenv("DEPTH_VARIANTS", "v2_vits").split(",") if name.strip()
+]
+DEPTH_DEFAULT_VARIANT = os.getenv("DEPTH_DEFAULT_VARIANT", "v2_vits")
+DEPTH_PREPROCESSING = os.getenv("DEPTH_PREPROCESSING", "default")
+# Meta-device construction + memory-mapped (safetensors) weights
+DEPTH_FAST_LOAD = os.getenv("DEPTH_FAST_LOAD", "1") == "1"
+# torch SDPA attention (0: explicit softmax(q @ k^T), for parity checks)
+DEPTH_FUSED_ATTENTION = os.getenv("DEPTH_FUSED_ATTENTION", "1") == "1"
+# Weight precision: "fp32", "bf16" (CPU or GPU) or "fp16" (CUDA only)
+DEPTH_PRECISION = os.getenv("DEPTH_PRECISION", "fp32")
+# Int8 CPU inference: "none", "dynamic" or "static" ViT linears, optionally
+# with static int8 DPT head convs; static modes calibrate on the images in
+# DEPTH_CALIBRATION_DIR
+DEPTH_QUANTIZATION = os.getenv("DEPTH_QUANTIZATION", "none")
+DEPTH_QUANTIZE_HEAD = os.getenv("DEPTH_QUANTIZE_HEAD", "0") == "1"
+DEPTH_CALIBRATION_DIR = os.getenv("DEPTH_CALIBRATION_DIR") or None
+# Batch images of different input shapes in one ragged (unpadded) ViT pass
+DEPTH_RAGGED_BATCHING = os.getenv("DEPTH_RAGGED_BATCHING", "0") == "1"
+# Let an image join the batch of a larger input shape, edge-padded, when the
+# padding adds at most this fraction of that shape's area (0: equal shapes only)
+DEPTH_MAX_PAD_RATIO = _env_float("DEPTH_MAX_PAD_RATIO", 0.0)
+# Image sizes (HxW, comma-separated) served most often; their interpolated
+# positional embeddings are computed when a model loads
+DEPTH_WARMUP_SHAPES = _env_shapes("DEPTH_WARMUP_SHAPES")
+# "trace" or "compile": build shape-specialized graphs for DEPTH_WARMUP_SHAPES
+# at each of DEPTH_COMPILE_BATCH_SIZES when a model loads ("none": eager)
+DEPTH_COMPILE = os.getenv("DEPTH_COMPILE", "none")
+DEPTH_COMPILE_BATCH_SIZES = tuple(
+    int(size) for size in os.getenv("DEPTH_COMPILE_BATCH_SIZES", "1").split(",")
+)
+# "torch", or "onnx" to run the network under ONNX Runtime (export the
+# models first with `python -m src.depth_estimation.onnx_export`)
+DEPTH_BACKEND = os.getenv("DEPTH_BACKEND", "torch")
+# Cap on patch tokens (patch_h * patch_w) per /predict image; requests may
+# ask for less, never more (0: no cap)
+DEPTH_MAX_TOKENS = _env_int("DEPTH_MAX_TOKENS", 0) or None
+
+# /predict micro-batching
+PREDICT_MAX_BATCH_SIZE = _env_int("PREDICT_MAX_BATCH_SIZE", 8)
+PREDICT_MAX_WAIT_MS = _env_float("PREDICT_MAX_WAIT_MS", 10.0)
+PREDICT_MAX_QUEUE_SIZE = _env_int("PREDICT_MAX_QUEUE_SIZE", 64)
+
+# /predict/stream video depth: frames per forward pass, decoded frames that
+# may wait before the oldest is skipped (at least the batch size, since a
+# batch only takes waiting frames), and the weight of the history in the
+# smoothed normalization range (0: normalize every frame on its own)
+STREAM_MAX_BATCH_SIZE = _env_int("STREAM_MAX_BATCH_SIZE", 4)
+STREAM_MAX_PENDING_FRAMES = _env_int("STREAM_MAX_PENDING_FRAMES", 4)
+STREAM_RANGE_MOMENTUM = _env_float("STREAM_RANGE_MOMENTUM", 0.8)
+
+# Inference executors (worker threads that run the models off the event loop)
+DEPTH_WORKERS = _env_int("DEPTH_WORKERS", 1)
+DEPTH_TORCH_THREADS = _env_int("DEPTH_TORCH_THREADS", 0) or None
+DEPTH_MAX_CONCURRENCY = _env_int("DEPTH_MAX_CONCURRENCY", 0) or None
+LVLM_WORKERS = _env_int("LVLM_WORKERS", 1)
+LVLM_TORCH_THREADS = _env_int("LVLM_TORCH_THREADS", 0) or None
+LVLM_MAX_CONCURRENCY = _env_int("LVLM_MAX_CONCURRENCY", 0) or None
+
+# Response image encoding
+RESPONSE_IMAGE_FORMAT = os.getenv("RESPONSE_IMAGE_FORMAT", "png")
+RESPONSE_PNG_COMPRESSION = _env_int("RESPONSE_PNG_COMPRESSION", 1)
+RESPONSE_IMAGE_QUALITY = _env_int("RESPONSE_IMAGE_QUALITY", 85)
+
+# Upload ingestion
+MAX_UPLOAD_BYTES = _env_int("MAX_UPLOAD_BYTES", 50 * 1024 * 1024)
+MAX_IMAGE_PIXELS = _env_int("MAX_IMAGE_PIXELS", 50_000_000)
+# Decode large JPEGs at 1/2, 1/4 or 1/8 scale when the model input is much smaller
+REDUCED_DECODE = os.getenv("REDUCED_DECODE", "1") == "1"
+
+# Result cache (content-addressed, keyed by upload bytes and output options)
+RESULT_CACHE_BYTES = _env_int("RESULT_CACHE_BYTES", 256 * 1024 * 1024)
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR") or None
+RESULT_CACHE_DISK_BYTES = _env_int("RESULT_CACHE_DISK_BYTES", 2 * 1024 * 1024 * 1024)
+
+# DepthGPT sessions (per-photo depth map, image tensor and prefix KV cache)
+DEPTHGPT_MAX_SESSIONS = _env_int("DEPTHGPT_MAX_SESSIONS", 4)
+DEPTHGPT_SESSION_TTL_S = _env_float("DEPTHGPT_SESSION_TTL_S", 1800.0)
@@ -0,0 +1,238 @@
+# src/backend/encoding.py
+
+import struct
+import time
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Output formats of /predict, selected with `?format=` or the Accept header.
+#   json:  colorized PNG, base64 encoded in a JSON body (default)
+#   png:   colorized PNG bytes
+#   npy:   raw float32 depth as a .npy file
+#   npy16: raw float16 depth as a .npy file
+#   png16: 16-bit grayscale PNG, depth = value * scale + offset
+#   u16:   DEPTH_U16_HEADER followed by little-endian uint16 pixels,
+#          depth = value * scale + offset
+DEPTH_FORMATS = ("json", "png", "npy", "npy16", "png16", "u16")
+RAW_DEPTH_FORMATS = ("npy", "npy16", "png16", "u16")
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "png": "image/png",
+    "npy": "application/x-npy",
+    "npy16": "application/x-npy",
+    "png16": "image/png",
+    "u16": "application/x-depth-u16",
+}
+
+# magic, height, width, scale, offset
+DEPTH_U16_HEADER = struct.Struct("<4sIIff")
+DEPTH_U16_MAGIC = b"DU16"
+
+CHUNK_SIZE = 1 << 16
+
+# Response headers browsers may read (CORS)
+EXPOSED_HEADERS = [
+    "X-Depth-Height",
+    "X-Depth-Width",
+    "X-Depth-Scale",
+    "X-Depth-Offset",
+    "X-Encode-Time-Ms",
+    "X-Cache",
+    "X-Depth-Model",
+    "X-Depth-Input-Size",
+    "X-Depth-Input-Shape",
+]
+
+
+class UnsupportedFormatError(ValueError):
+    """Raised when no supported depth format matches the request."""
+
+
+def _parse_accept(accept: str):
+    """Accept header -> [(media type, params)] ordered by q-value."""
+    entries = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *raw_params = [p.strip() for p in part.split(";")]
+        params = dict(p.split("=", 1) for p in raw_params if "=" in p)
+        params = {k.strip().lower(): v.strip() for k, v in params.items()}
+        try:
+            q = float(params.pop("q", 1))
+        except ValueError:
+            q = 0.0
+        if media_type and q > 0:
+            entries.append((-q, position, media_type.lower(), params))
+    return [(media_type, params) for _, _, media_type, params in sorted(entries)]
+
+
+def negotiate_depth_format(accept: Optional[str], fmt: Optional[str] = None) -> str:
+    """
+    Pick the output format from an explicit `fmt` or the Accept header.
+
+    Media types understood:
+        application/json, application/*        -> json
+        image/png, image/*, */*                -> png
+        image/png; bits=16                     -> png16
+        application/x-npy [; dtype=float16]    -> npy / npy16
+        application/x-depth-u16                -> u16
+
+    Without an Accept header the default is json. Only an unknown `fmt` is
+    an error; an Accept header with nothing supported falls back to png.
+    """
+    if fmt:
+        if fmt not in DEPTH_FORMATS:
+            raise UnsupportedFormatError(
+                f"Unknown format {fmt!r}, expected one of {DEPTH_FORMATS}."
+            )
+        return fmt
+
+    if not accept:
+        return "json"
+
+    for media_type, params in _parse_accept(accept):
+        if media_type in ("application/json", "application/*"):
+            return "json"
+        if media_type in ("*/*", "image/*"):
+            return "png"
+        if media_type == "image/png":
+            return "png16" if params.get("bits") == "16" else "png"
+        if media_type == "application/x-npy":
+            return "npy16" if params.get("dtype") == "float16" else "npy"
+        if media_type == "application/x-depth-u16":
+            return "u16"
+
+    return "png"
+
+
+def quantize_u16(depth: np.ndarray) -> Tuple[np.ndarray, float, float]:
+    """Float depth -> (uint16 values, scale, offset) with depth ~= values * scale + offset."""
+    low, high = float(depth.min()), float(depth.max())
+    scale = (high - low) / 65535 if high > low else 1.0
+    values = np.round((depth - low) / scale).astype("<u2")
+    return values, scale, low
+
+
+def iter_chunks(data: bytes | memoryview) -> Iterator[bytes]:
+    """Split a body into CHUNK_SIZE pieces for a streaming response."""
+    view = memoryview(data)
+    for start in range(0, len(view), CHUNK_SIZE):
+        yield bytes(view[start : start + CHUNK_SIZE])
+
+
+def encode_raw_depth(depth: np.ndarray, fmt: str) -> Tuple[Iterator[bytes], dict]:
+    """
+    Encode a float depth map in one of RAW_DEPTH_FORMATS.
+
+    Returns an iterator over the body chunks (suitable for a streaming
+    response) and the extra response headers.
+    """
+    headers = {
+        "X-Depth-Height": str(depth.shape[0]),
+        "X-Depth-Width": str(depth.shape[1]),
+    }
+
+    if fmt in ("npy", "npy16"):
+        buffered = BytesIO()
+        np.save(buffered, depth.astype(np.float16 if fmt == "npy16" else np.float32))
+        return iter_chunks(buffered.getbuffer()), headers
+
+    values, scale, offset = quantize_u16(depth)
+    headers.update({"X-Depth-Scale": repr(scale), "X-Depth-Offset": repr(offset)})
+
+    if fmt == "png16":
+        ok, encoded = cv2.imencode(".png", values)
+        if not ok:
+            raise RuntimeError("PNG encoding failed")
+        return iter_chunks(encoded.data), headers
+
+    if fmt == "u16":
+        header = DEPTH_U16_HEADER.pack(
+            DEPTH_U16_MAGIC, values.shape[0], values.shape[1], scale, offset
+        )
+
+        def body():
+            yield header
+            yield from iter_chunks(values.data)
+
+        return body(), headers
+
+    raise UnsupportedFormatError(f"{fmt!r} is not a raw depth format.")
+
+
+# Image formats the response encoder can produce: cv2 extension, media type
+IMAGE_FORMATS = {
+    "png": (".png", "image/png"),
+    "webp": (".webp", "image/webp"),
+    "jpeg": (".jpg", "image/jpeg"),
+}
+
+# Uploads in these formats can be echoed back to browsers unchanged
+PASSTHROUGH_MIME_TYPES = (
+    "image/jpeg",
+    "image/jpg",
+    "image/png",
+    "image/webp",
+    "image/gif",
+)
+
+
+@dataclass
+class EncodedImage:
+    data: bytes
+    media_type: str
+    encode_ms: float
+
+
+class ImageEncoder:
+    """
+    Encodes response images; shared by all endpoints.
+
+    `format` is "png" (lossless, `png_compression` 0-9 trades size for CPU),
+    or "webp"/"jpeg" (lossy previews at `quality` 0-100). `encode` takes
+    RGB-ordered uint8 arrays, the same convention as `PIL.Image.fromarray`.
+    """
+
+    def __init__(
+        self, format: str = "png", png_compression: int = 1, quality: int = 85
+    ):
+        if format not in IMAGE_FORMATS:
+            raise ValueError(
+                f"Unknown image format {format!r}, expected one of {list(IMAGE_FORMATS)}."
+            )
+
+        self.format = format
+        self.extension, self.media_type = IMAGE_FORMATS[format]
+
+        if format == "png":
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+        elif format == "webp":
+            self.params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+        else:
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+
+    def encode(self, image: np.ndarray) -> EncodedImage:
+        started = time.perf_counter()
+
+        ok, encoded = cv2.imencode(
+            self.extension, cv2.cvtColor(image, cv2.COLOR_RGB2BGR), self.params
+        )
+        if not ok:
+            raise RuntimeError(f"{self.format} encoding failed")
+
+        return EncodedImage(
+            encoded.tobytes(),
+            self.media_type,
+            (time.perf_counter() - started) * 1000,
+        )
+
+    def encode_original(
+        self, data: bytes, content_type: Optional[str], image: np.ndarray
+    ) -> EncodedImage:
+        """Echo an upload back: its bytes unchanged when browsers can show them, else `encode(image)`."""
+        if content_type in PASSTHROUGH_MIME_TYPES:
+            return EncodedImage(data, content_type, 0.0)
+        return self.encode(image)
@@ -0,0 +1,115 @@
+# src/backend/executor.py
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+import numpy as np
+import torch
+from loguru import logger
+
+
+class InferenceExecutor:
+    """
+    Dedicated worker threads for blocking model calls.
+
+    Handlers `await executor.run(fn, *args)` instead of calling the model on
+    the event loop. Each worker pins its torch intra-op thread count to
+    `torch_threads` (when given), and at most `max_concurrency` calls may be
+    queued or running at once; further callers wait for a free slot.
+
+    Queue time (submission until a worker picks the call up) and run time are
+    kept over a sliding window and reported by `stats`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int = 1,
+        torch_threads: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        window: int = 1024,
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.torch_threads = torch_threads
+        self.max_concurrency = max_concurrency or 4 * max_workers
+
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=f"{name}-worker",
+            initializer=self._init_worker,
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        self._lock = threading.Lock()
+        self._queue_times = deque(maxlen=window)
+        self._run_times = deque(maxlen=window)
+        self._completed = 0
+        self._failed = 0
+        self._in_flight = 0
+
+    def _init_worker(self) -> None:
+        if self.torch_threads:
+            torch.set_num_threads(self.torch_threads)
+        logger.info(
+            f"{self.name} worker started with {torch.get_num_threads()} torch thread(s)"
+        )
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        submitted = time.perf_counter()
+
+        def call():
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._queue_times.append(started - submitted)
+                    self._run_times.append(finished - started)
+
+        async with self._semaphore:
+            self._in_flight += 1
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self._pool, call
+                )
+            except Exception:
+                self._failed += 1
+                raise
+            finally:
+                self._in_flight -= 1
+
+        self._completed += 1
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            queue_times = np.array(self._queue_times) * 1000
+            run_times = np.array(self._run_times) * 1000
+
+        def summary(values):
+            if not len(values):
+                return {"p50_ms": None, "p99_ms": None, "max_ms": None}
+            return {
+                "p50_ms": round(float(np.percentile(values, 50)), 2),
+                "p99_ms": round(float(np.percentile(values, 99)), 2),
+                "max_ms": round(float(values.max()), 2),
+            }
+
+        return {
+            "workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "completed": self._completed,
+            "failed": self._failed,
+            "queue_time": summary(queue_times),
+            "run_time": summary(run_times),
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,130 @@
+# src/backend/ingest.py
+
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+# EXIF orientations that swap width and height (cv2.imdecode applies them)
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+_REDUCED_DECODE_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+
+
+class ImageDecodeError(ValueError):
+    """Raised when an upload is not a decodable image."""
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured byte or pixel limits."""
+
+
+@dataclass
+class IngestedImage:
+    """
+    An upload decoded exactly once.
+
+    `image` is the decoded uint8 BGR array (cv2 convention) that every
+    consumer shares; it may be a reduced-resolution decode, in which case
+    `original_size` is the (height, width) of the full image.
+    """
+
+    data: bytes
+    content_type: Optional[str]
+    image: np.ndarray
+    original_size: Tuple[int, int]
+    reduction: int = 1
+    _pil: Optional[Image.Image] = field(default=None, repr=False)
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """RGB view of `image` (no copy)."""
+        return self.image[..., ::-1]
+
+    def to_pil(self) -> Image.Image:
+        """RGB PIL image for consumers that need one (the LVLM); built once."""
+        if self._pil is None:
+            self._pil = Image.fromarray(np.ascontiguousarray(self.rgb), mode="RGB")
+        return self._pil
+
+
+def _reduction_factor(height: int, width: int, min_side: Optional[int]) -> int:
+    """Largest JPEG DCT scale (1/2, 1/4, 1/8) that keeps the short side >= min_side."""
+    if not min_side:
+        return 1
+    for factor in _REDUCED_DECODE_FLAGS:
+        if min(height, width) // factor >= min_side:
+            return factor
+    return 1
+
+
+def ingest_image(
+    data: bytes,
+    content_type: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+    max_pixels: Optional[int] = None,
+    min_side: Optional[int] = None,
+) -> IngestedImage:
+    """
+    Validate and decode an upload.
+
+    The byte size and the pixel count (read from the image header, without
+    decoding) are checked against `max_bytes` / `max_pixels` first. JPEGs
+    whose short side is several times `min_side` are decoded at reduced
+    resolution by libjpeg's DCT scaling, which is much cheaper than a full
+    decode followed by a resize.
+    """
+    if max_bytes and len(data) > max_bytes:
+        raise ImageTooLargeError(f"Upload is larger than {max_bytes} bytes.")
+
+    try:
+        header = Image.open(BytesIO(data))
+    except Image.DecompressionBombError as e:
+        # PIL's own limit (~179M pixels) trips before ours can be checked
+        raise ImageTooLargeError(str(e)) from e
+    except (UnidentifiedImageError, OSError) as e:
+        raise ImageDecodeError("Could not decode image") from e
+
+    width, height = header.size
+    if max_pixels and width * height > max_pixels:
+        raise ImageTooLargeError(
+            f"Image has {width * height} pixels, the limit is {max_pixels}."
+        )
+
+    if header.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+
+    factor = 1
+    if header.format == "JPEG":
+        factor = _reduction_factor(height, width, min_side)
+
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    flags = _REDUCED_DECODE_FLAGS[factor] if factor > 1 else cv2.IMREAD_COLOR
+    image = cv2.imdecode(buffer, flags)
+
+    if image is None:
+        # Formats OpenCV cannot read (e.g. GIF) go through PIL instead
+        try:
+            rgb = np.asarray(header.convert("RGB"))
+        except OSError as e:
+            raise ImageDecodeError("Could not decode image") from e
+        image = np.ascontiguousarray(rgb[..., ::-1])
+        factor = 1
+
+    if factor == 1:
+        height, width = image.shape[:2]
+
+    return IngestedImage(
+        data=data,
+        content_type=content_type,
+        image=image,
+        original_size=(height, width),
+        reduction=factor,
+    )
@@ -1,22 +1,136 @@
 # src/backend/api/main.py
 
+import asyncio
 import base64
+import json
 import logging
-from io import BytesIO
+import time
 
+import cv2
+import numpy as np
 import requests
 from fastapi import FastAPI, File, Form
 from typing import Optional
 
-from fastapi import HTTPException, UploadFile
+from fastapi import (
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from PIL import Image
 
-from src.backend.models.depth_model import predict_depth
-from src.backend.models.lvlm_model import generate_response
+from src.backend import config
+from src.backend.batching import BatchScheduler, QueueFullError
+from src.backend.cache import CacheEntry, ResultCache
+from src.backend.encoding import (
+    DEPTH_FORMATS,
+    EXPOSED_HEADERS,
+    EncodedImage,
+    MEDIA_TYPES,
+    ImageEncoder,
+    RAW_DEPTH_FORMATS,
+    UnsupportedFormatError,
+    encode_raw_depth,
+    iter_chunks,
+    negotiate_depth_format,
+)
+from src.backend.executor import InferenceExecutor
+from src.backend.ingest import (
+    ImageDecodeError,
+    ImageTooLargeError,
+    IngestedImage,
+    ingest_image,
+)
+from src.backend.models.depth_model import (
+    DEFAULT_VARIANT,
+    DEPTH_SETTINGS,
+    INPUT_SIZE,
+    VARIANTS,
+    DepthRequest,
+    depth_batch_key,
+    model_key,
+    predict_depth,
+    predict_depth_batch,
+    predict_depth_frames,
+)
+from src.backend.models.lvlm_model import (
+    generate_response,
+    prepare_session,
+    respond_in_session,
+)
+from src.backend.models.registry import ModelLoadError, registry
+from src.backend.sessions import DepthGPTSession, SessionStore
+from src.backend.streaming import FrameQueue
+from src.depth_estimation.postprocess import RangeSmoother
+from src.depth_estimation.resolution import (
+    RESOLUTION_MODES,
+    Resolution,
+    base_input_size,
+    select_resolution,
+)
 
 app = FastAPI(title="Depth Estimation API")
 
+# Model calls run on dedicated worker threads so they never block the event loop
+depth_executor = InferenceExecutor(
+    "depth",
+    max_workers=config.DEPTH_WORKERS,
+    torch_threads=config.DEPTH_TORCH_THREADS,
+    max_concurrency=config.DEPTH_MAX_CONCURRENCY,
+)
+lvlm_executor = InferenceExecutor(
+    "lvlm",
+    max_workers=config.LVLM_WORKERS,
+    torch_threads=config.LVLM_TORCH_THREADS,
+    max_concurrency=config.LVLM_MAX_CONCURRENCY,
+)
+
+# Coalesces concurrent /predict requests into batched forward passes
+depth_scheduler = BatchScheduler(
+    predict_depth_batch,
+    key_fn=depth_batch_key,
+    max_batch_size=config.PREDICT_MAX_BATCH_SIZE,
+    max_wait_ms=config.PREDICT_MAX_WAIT_MS,
+    max_queue_size=config.PREDICT_MAX_QUEUE_SIZE,
+    executor=depth_executor,
+)
+
+# Response image encoders; `png_encoder` serves explicit ?format=png requests
+image_encoder = ImageEncoder(
+    config.RESPONSE_IMAGE_FORMAT,
+    png_compression=config.RESPONSE_PNG_COMPRESSION,
+    quality=config.RESPONSE_IMAGE_QUALITY,
+)
+png_encoder = ImageEncoder("png", png_compression=config.RESPONSE_PNG_COMPRESSION)
+
+# Everything besides the request that changes a cached body; part of every
+# key, so the disk tier never serves results made under an earlier config
+RESULT_SETTINGS = (
+    *DEPTH_SETTINGS,
+    config.RESPONSE_IMAGE_FORMAT,
+    config.RESPONSE_PNG_COMPRESSION,
+    config.RESPONSE_IMAGE_QUALITY,
+)
+
+# Encoded depth results by upload content; shared by /predict and /depthgpt
+result_cache = ResultCache(
+    config.RESULT_CACHE_BYTES,
+    disk_dir=config.RESULT_CACHE_DIR,
+    disk_max_bytes=config.RESULT_CACHE_DISK_BYTES,
+)
+
+# Per-photo DepthGPT state, so follow-up prompts only run the new tokens
+depthgpt_sessions = SessionStore(
+    config.DEPTHGPT_MAX_SESSIONS, ttl_s=config.DEPTHGPT_SESSION_TTL_S
+)
+
 origins = [
     "http://localhost:8080",  # Frontend origin
     # Add other allowed origins if necessary
@@ -28,6 +142,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=EXPOSED_HEADERS,
 )
 
 ALLOWED_MIME_TYPES = [
@@ -41,15 +156,136 @@ ALLOWED_MIME_TYPES = [
 ]
 
 
+async def read_upload(file: UploadFile, min_side: Optional[int] = None) -> IngestedImage:
+    """Read and decode an upload once, mapping ingestion errors to HTTP errors."""
+    return await decode_upload(await file.read(), file.content_type, min_side)
+
+
+async def decode_upload(
+    data: bytes, content_type: Optional[str], min_side: Optional[int] = None
+) -> IngestedImage:
+    try:
+        return await run_in_threadpool(
+            ingest_image,
+            data,
+            content_type,
+            max_bytes=config.MAX_UPLOAD_BYTES,
+            max_pixels=config.MAX_IMAGE_PIXELS,
+            min_side=min_side if config.REDUCED_DECODE else None,
+        )
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ImageDecodeError:
+        raise HTTPException(status_code=400, detail="Could not decode image")
+
+
+def depth_cache_key(
+    data: bytes,
+    variant: str,
+    output_format: str,
+    resolution: tuple = ("full", INPUT_SIZE, None),
+) -> str:
+    # `resolution`: the parameters the input size is derived from
+    return ResultCache.make_key(
+        data, variant, *resolution, output_format, *RESULT_SETTINGS
+    )
+
+
+def token_cap(max_tokens: Optional[int]) -> Optional[int]:
+    """A request's `max_tokens`, never above DEPTH_MAX_TOKENS; ValueError if not positive."""
+    if config.DEPTH_MAX_TOKENS:
+        max_tokens = min(max_tokens or config.DEPTH_MAX_TOKENS, config.DEPTH_MAX_TOKENS)
+    if max_tokens is not None and max_tokens < 1:
+        raise ValueError("max_tokens must be positive")
+    return max_tokens
+
+
+def require_models(*names: str) -> None:
+    """503 when this deployment does not serve one of the models (see SERVED_MODELS)."""
+    for name in names:
+        if not registry.is_served(name):
+            raise HTTPException(
+                status_code=503, detail=f"Model {name!r} is not served by this deployment"
+            )
+
+
+@app.exception_handler(ModelLoadError)
+async def model_load_failed(request, exc: ModelLoadError):
+    # Missing or broken weights: the deployment cannot serve this model right now
+    return JSONResponse({"detail": str(exc)}, status_code=503)
+
+
+@app.on_event("startup")
+def warm_up_models():
+    # Background loading: the server accepts traffic immediately and the
+    # first request to a model that is still loading waits for it
+    if config.MODEL_WARMUP:
+        registry.warm_up()
+
+
+@app.on_event("shutdown")
+def shutdown_executors():
+    depth_executor.shutdown(wait=False)
+    lvlm_executor.shutdown(wait=False)
+
+
+@app.get("/health")
+async def health():
+    """Liveness probe; also reports inference queue statistics."""
+    return {
+        "status": "ok",
+        "models": registry.status(),
+        "model_memory": registry.memory(),
+        "predict_queue_depth": depth_scheduler.queue_depth,
+        "result_cache": result_cache.stats(),
+        "depthgpt_sessions": depthgpt_sessions.stats(),
+        "executors": {
+            "depth": depth_executor.stats(),
+            "lvlm": lvlm_executor.stats(),
+        },
+    }
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once every served model is loaded, else 503."""
+    status = registry.status()
+    if not registry.ready():
+        return JSONResponse({"ready": False, "models": status}, status_code=503)
+    return {"ready": True, "models": status}
+
+
 @app.post("/predict")
 async def predict_depth_map(
     file: UploadFile = File(None),
+    format: Optional[str] = Query(None, description=f"One of {DEPTH_FORMATS}"),
+    model: Optional[str] = Query(None, description=f"Depth model, one of {VARIANTS}"),
+    resolution: str = Query("full", description=f"One of {RESOLUTION_MODES}"),
+    input_size: Optional[int] = Query(None, description="Multiple of 14, e.g. 364"),
+    max_tokens: Optional[int] = Query(None, description="Cap on patch_h * patch_w"),
+    accept: Optional[str] = Header(None),
 ):
     """
     Predict the depth map from an input image.
 
-    This endpoint accepts image files via multipart/form-data.
+    This endpoint accepts image files via multipart/form-data. The output
+    format comes from `format` or the Accept header (default: colorized PNG,
+    base64 in JSON). The model variant and input size used are returned in
+    the X-Depth-* headers.
     """
+    variant = model or DEFAULT_VARIANT
+    if variant not in VARIANTS:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown model {variant!r}, expected one of {VARIANTS}"
+        )
+    require_models(model_key(variant))
+
+    try:
+        ceiling = base_input_size(resolution, input_size)
+        max_tokens = token_cap(max_tokens)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     if not file:
         raise HTTPException(status_code=400, detail="No file provided")
 
@@ -57,23 +293,221 @@ async def predict_depth_map(
         raise HTTPException(status_code=400, detail="Unsupported file type")
 
     try:
-        image_bytes = await file.read()
+        output_format = negotiate_depth_format(accept, format)
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+    # Identical uploads are answered from the cache without being decoded
+    data = await file.read()
+    key = await run_in_threadpool(
+        depth_cache_key, data, variant, output_format, (resolution, ceiling, max_tokens)
+    )
+
+    async def compute() -> CacheEntry:
+        # The chosen input size never exceeds `ceiling`
+        upload = await decode_upload(data, file.content_type, min_side=ceiling)
+        chosen = select_resolution(
+            *upload.image.shape[:2], resolution, input_size=ceiling, max_tokens=max_tokens
+        )
+        return await predict_and_encode(upload, variant, output_format, chosen)
+
+    entry, hit = await result_cache.get_or_compute(key, compute)
+    headers = {**entry.headers, "X-Cache": "hit" if hit else "miss"}
+
+    if output_format in RAW_DEPTH_FORMATS:
+        return StreamingResponse(
+            iter_chunks(entry.data), media_type=entry.media_type, headers=headers
+        )
+
+    return Response(entry.data, media_type=entry.media_type, headers=headers)
+
+
+def depth_headers(variant: str, resolution: Resolution) -> dict:
+    """Response headers naming the model and input size a depth map came from."""
+    return {
+        "X-Depth-Model": variant,
+        "X-Depth-Input-Size": str(resolution.input_size),
+        "X-Depth-Input-Shape": "x".join(map(str, resolution.shape)),
+    }
+
+
+def encode_raw_body(depth_map: np.ndarray, output_format: str) -> tuple[bytes, dict]:
+    """`encode_raw_depth` as one cacheable body, with its encode time (blocking)."""
+    started = time.perf_counter()
+    chunks, headers = encode_raw_depth(depth_map, output_format)
+    body = b"".join(chunks)
+    headers["X-Encode-Time-Ms"] = f"{(time.perf_counter() - started) * 1000:.2f}"
+    return body, headers
+
+
+async def predict_and_encode(
+    upload: IngestedImage,
+    variant: str,
+    output_format: str,
+    resolution: Optional[Resolution] = None,
+) -> CacheEntry:
+    """Run an upload through the batch scheduler and encode the /predict body."""
+    if resolution is None:
+        resolution = select_resolution(*upload.image.shape[:2], input_size=INPUT_SIZE)
+
+    request = DepthRequest(
+        upload.image,
+        raw=output_format in RAW_DEPTH_FORMATS,
+        output_size=upload.original_size,
+        variant=variant,
+        input_size=resolution.input_size,
+    )
+    resolution_headers = depth_headers(variant, resolution)
+
+    try:
+        depth_map = await depth_scheduler.submit(request)
+    except QueueFullError:
+        raise HTTPException(status_code=429, detail="Too many requests, retry later")
+    except ModelLoadError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logging.error(f"Error in depth prediction: {e}")
+        raise HTTPException(status_code=500, detail="Depth prediction failed")
 
-        depth_map = predict_depth(image_bytes)
+    if request.raw:
+        body, headers = await run_in_threadpool(encode_raw_body, depth_map, output_format)
+        headers.update(resolution_headers)
+        return CacheEntry(body, MEDIA_TYPES[output_format], headers)
 
-        # Encode depth map to PNG and then to base64
-        depth_image = Image.fromarray(depth_map, mode="RGB")
+    encoder = png_encoder if output_format == "png" else image_encoder
 
-        # Save the image to a buffer
-        buffered = BytesIO()
-        depth_image.save(buffered, format="PNG")
-        depth_map_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        logging.info("Depth map encoded successfully")
+    try:
+        encoded = await run_in_threadpool(encoder.encode, depth_map)
+        logging.info(f"Depth map encoded in {encoded.encode_ms:.2f} ms")
     except Exception as e:
         logging.error(f"Error in depth prediction: {e}")
         raise HTTPException(status_code=500, detail="Depth prediction failed")
 
-    return {"depth_map": depth_map_base64}
+    headers = {"X-Encode-Time-Ms": f"{encoded.encode_ms:.2f}", **resolution_headers}
+
+    if output_format == "png":
+        return CacheEntry(encoded.data, encoded.media_type, headers)
+
+    depth_map_base64 = base64.b64encode(encoded.data).decode("utf-8")
+    body = json.dumps(
+        {
+            "depth_map": depth_map_base64,
+            "depth_map_media_type": encoded.media_type,
+            "model": variant,
+            "resolution": resolution.as_dict(),
+        },
+        separators=(",", ":"),
+    )
+
+    return CacheEntry(body.encode("utf-8"), MEDIA_TYPES["json"], headers)
+
+
+@app.websocket("/predict/stream")
+async def stream_depth_maps(
+    websocket: WebSocket,
+    model: Optional[str] = None,
+    resolution: str = "full",
+    input_size: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+):
+    """
+    Depth for a live video feed over a WebSocket.
+
+    The client sends every frame as one binary message (JPEG, PNG or any
+    format /predict accepts). For each processed frame the server sends a
+    JSON text message, immediately followed by the colorized depth frame as
+    a binary message. The JSON carries "frame" (index among the frames sent
+    so far), "model", "input_size", "media_type" and the stream counters
+    "received", "skipped" and "pending". A text message ends the stream:
+    the frames still waiting are answered, then the server closes.
+
+    Frames are decoded as they arrive while earlier ones are inferred, then
+    batched (STREAM_MAX_BATCH_SIZE) through the model. When inference cannot
+    keep up, the oldest waiting frames are skipped, so results stay close to
+    live. The depth range each frame is normalized to is smoothed across
+    frames (STREAM_RANGE_MOMENTUM) to avoid flicker. `model`, `resolution`,
+    `input_size` and `max_tokens` work as on /predict.
+    """
+    variant = model or DEFAULT_VARIANT
+    try:
+        if variant not in VARIANTS:
+            raise ValueError(f"Unknown model {variant!r}, expected one of {VARIANTS}")
+        if not registry.is_served(model_key(variant)):
+            raise ValueError(f"Model {variant!r} is not served by this deployment")
+        ceiling = base_input_size(resolution, input_size)
+        max_tokens = token_cap(max_tokens)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+
+    await websocket.accept()
+
+    frames = FrameQueue(config.STREAM_MAX_PENDING_FRAMES, config.STREAM_MAX_BATCH_SIZE)
+    smoother = RangeSmoother(config.STREAM_RANGE_MOMENTUM)
+
+    async def receive_frames():
+        index = 0
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    frames.close(drop_pending=True)
+                    return
+                if message.get("bytes") is None:
+                    return
+
+                try:
+                    upload = await decode_upload(message["bytes"], None, min_side=ceiling)
+                except HTTPException as e:
+                    logging.warning(f"Skipping undecodable stream frame {index}: {e.detail}")
+                    frames.skipped += 1
+                else:
+                    frames.push(index, upload.image)
+                index += 1
+        finally:
+            frames.close()
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while batch := await frames.next_batch():
+            indices = [index for index, _ in batch]
+            images = [image for _, image in batch]
+            chosen = select_resolution(
+                *images[0].shape[:2], resolution, input_size=ceiling, max_tokens=max_tokens
+            )
+
+            colored = await depth_executor.run(
+                predict_depth_frames, images, smoother, variant, chosen.input_size
+            )
+
+            for index, depth_frame in zip(indices, colored):
+                encoded = await run_in_threadpool(image_encoder.encode, depth_frame)
+                await websocket.send_json(
+                    {
+                        "frame": index,
+                        "model": variant,
+                        "input_size": chosen.input_size,
+                        "media_type": encoded.media_type,
+                        **frames.stats(),
+                    }
+                )
+                await websocket.send_bytes(encoded.data)
+        code, reason = 1000, None
+    except WebSocketDisconnect:
+        return
+    except ModelLoadError as e:
+        code, reason = 1013, str(e)  # Try again later
+    except Exception as e:
+        logging.error(f"Error in depth stream: {e}")
+        code, reason = 1011, "Depth prediction failed"
+    finally:
+        receiver.cancel()
+
+    try:
+        await websocket.close(code=code, reason=reason)
+    except RuntimeError:
+        # The client disconnected first
+        pass
 
 
 # from transformers import AutoModelForCausalLM, AutoTokenizer
@@ -125,6 +559,78 @@ async def predict_depth_map(
 # )
 
 
+def decode_depth_png(data: bytes) -> np.ndarray:
+    """Cached colorized depth PNG -> RGB uint8 array."""
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+async def start_depthgpt_session(upload: IngestedImage) -> DepthGPTSession:
+    """Depth map, response images and LVLM prefix state for a new photo."""
+    # Convert the shared decoded frame to a PIL Image for the LVLM
+    original_image = await run_in_threadpool(upload.to_pil)
+
+    # Predict depth map, or reuse the colorized PNG cached for this upload
+    # (an earlier ?format=png, or a session evicted since); the entry carries
+    # the same headers as one /predict stores
+    computed = {}
+
+    async def compute_depth() -> CacheEntry:
+        computed["depth_map"] = await depth_executor.run(
+            predict_depth, upload.image, upload.original_size
+        )
+        encoded = await run_in_threadpool(png_encoder.encode, computed["depth_map"])
+        resolution = select_resolution(*upload.image.shape[:2], input_size=INPUT_SIZE)
+        return CacheEntry(
+            encoded.data,
+            encoded.media_type,
+            {
+                "X-Encode-Time-Ms": f"{encoded.encode_ms:.2f}",
+                **depth_headers(DEFAULT_VARIANT, resolution),
+            },
+        )
+
+    key = await run_in_threadpool(depth_cache_key, upload.data, DEFAULT_VARIANT, "png")
+    depth_png, _ = await result_cache.get_or_compute(key, compute_depth)
+
+    depth_map = computed.get("depth_map")
+    if depth_map is None:
+        depth_map = await run_in_threadpool(decode_depth_png, depth_png.data)
+
+    # Convert depth map to PIL Image
+    depth_image = Image.fromarray(depth_map, mode="RGB")
+
+    image_tensor, prefix_kv, prefix_len = await lvlm_executor.run(
+        prepare_session, [original_image, depth_image]
+    )
+
+    # Response images; the PNG from the result cache is reused when it matches
+    if image_encoder.format == "png":
+        encoded_depth = EncodedImage(depth_png.data, depth_png.media_type, 0.0)
+    else:
+        encoded_depth = await run_in_threadpool(image_encoder.encode, depth_map)
+
+    # The upload is echoed back as-is unless browsers cannot display it
+    encoded_rgb = await run_in_threadpool(
+        image_encoder.encode_original,
+        upload.data,
+        upload.content_type,
+        np.asarray(original_image),
+    )
+
+    encode_ms = encoded_depth.encode_ms + encoded_rgb.encode_ms
+    logging.info(f"DepthGPT images encoded in {encode_ms:.2f} ms")
+
+    return DepthGPTSession(
+        depth_map=depth_map,
+        encoded_depth=encoded_depth,
+        encoded_rgb=encoded_rgb,
+        image_tensor=image_tensor,
+        prefix_kv=prefix_kv,
+        prefix_len=prefix_len,
+    )
+
+
 # Add the new endpoint
 @app.post("/depthgpt")
 async def depth_gpt(
@@ -135,45 +641,48 @@ async def depth_gpt(
     Handle DepthGPT functionality by processing the image, generating depth map,
     and interacting with the LVLM model.
     """
+    require_models(model_key(DEFAULT_VARIANT), "lvlm")
+
     if not file:
         raise HTTPException(status_code=400, detail="No file provided")
 
     if file.content_type not in ALLOWED_MIME_TYPES:
         raise HTTPException(status_code=400, detail="Unsupported file type")
 
-    try:
-        # Read the image bytes
-        image_bytes = await file.read()
-
-        # Convert the original image bytes to a PIL Image
-        original_image = Image.open(BytesIO(image_bytes)).convert('RGB')
+    # Follow-up questions about the same photo reuse its session: depth map,
+    # processed image tensor and prefix KV cache
+    data = await file.read()
+    key = await run_in_threadpool(depth_cache_key, data, DEFAULT_VARIANT, "depthgpt")
 
-        # Predict depth map
-        depth_map = predict_depth(image_bytes)
+    async def create_session() -> DepthGPTSession:
+        upload = await decode_upload(data, file.content_type, min_side=INPUT_SIZE)
+        return await start_depthgpt_session(upload)
 
-        # Convert depth map to PIL Image
-        depth_image = Image.fromarray(depth_map, mode="RGB")
-
-        # Prepare images list for generate_response
-        images_list = [original_image, depth_image]
+    try:
+        session, _ = await depthgpt_sessions.get_or_create(key, create_session)
 
         # Generate response from LVLM model
-        lvlm_output = generate_response(prompt, images_list)
+        lvlm_output = await lvlm_executor.run(respond_in_session, session, prompt)
 
         # Encode images to base64 for frontend display
-        depth_buffered = BytesIO()
-        depth_image.save(depth_buffered, format="PNG")
-        depth_map_base64 = base64.b64encode(depth_buffered.getvalue()).decode("utf-8")
-
-        rgb_buffered = BytesIO()
-        original_image.save(rgb_buffered, format="PNG")
-        rgb_image_base64 = base64.b64encode(rgb_buffered.getvalue()).decode("utf-8")
-
-        return {
-            "lvlm_response": lvlm_output['response'],
-            "depth_map": depth_map_base64,
-            "rgb_image": rgb_image_base64,
-        }
+        depth_map_base64 = base64.b64encode(session.encoded_depth.data).decode("utf-8")
+        rgb_image_base64 = base64.b64encode(session.encoded_rgb.data).decode("utf-8")
+
+        encode_ms = session.encoded_depth.encode_ms + session.encoded_rgb.encode_ms
+
+        return JSONResponse(
+            {
+                "lvlm_response": lvlm_output['response'],
+                "depth_map": depth_map_base64,
+                "depth_map_media_type": session.encoded_depth.media_type,
+                "rgb_image": rgb_image_base64,
+                "rgb_image_media_type": session.encoded_rgb.media_type,
+            },
+            headers={"X-Encode-Time-Ms": f"{encode_ms:.2f}"},
+        )
+    except (HTTPException, ModelLoadError):
+        # 400/413 from decoding the upload, 429/503/500 from the models
+        raise
     except Exception as e:
         logging.error(f"Error in depth_gpt: {e}")
         raise HTTPException(status_code=500, detail="DepthGPT processing failed")
@@ -183,14 +692,17 @@ from typing import List
 
 @app.post("/analyze")
 async def analyze_image(prompt: str = Form(...), images: List[UploadFile] = File(...)):
+    require_models("lvlm")
 
     image_list = []
     for image_file in images:
-        image_bytes = await image_file.read()
-        image = Image.open(BytesIO(image_bytes)).convert('RGB')
+        upload = await read_upload(image_file)
+        image = await run_in_threadpool(upload.to_pil)
         image_list.append(image)
 
-    response = generate_response(prompt, image_list)
+    response = await lvlm_executor.run(generate_response, prompt, image_list)
+
+    return response
 
 
 
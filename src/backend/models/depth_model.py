@@ -1,58 +1,163 @@
 import os
+from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
+from typing import List, Optional, Tuple
 
-import cv2
 import numpy as np
 import torch
 from loguru import logger
 from PIL import Image
 
+from src.backend import config
+from src.backend.models.registry import registry
+from src.depth_estimation.images import load_images
 from src.depth_estimation.estimation_model import DepthModel
+from src.depth_estimation.postprocess import RangeSmoother
+from src.depth_estimation.resolution import DEFAULT_INPUT_SIZE, network_shape
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 logger.info(f"Using device: {device}")
 
-# Adjust the root path as necessary
-root_path = Path(__file__).resolve().parents[3]
-weights_path_dict = {
-    "vits": Path(os.getcwd()) / "tmp/model-weights/depth_anything_v2_vits.pth",
-    "vitb": Path(os.getcwd()) / "tmp/model-weights/depth_anything_v2_vitb.pth",
-    "vitl": Path(os.getcwd()) / "tmp/model-weights/depth_anything_v2_vitl.pth",
-}
-
-model_configs = {
-    "vits": {"encoder": "vits", "features": 64, "out_channels": (48, 96, 192, 384)},
-    "vitb": {"encoder": "vitb", "features": 128, "out_channels": (96, 192, 384, 768)},
-    "vitl": {
-        "encoder": "vitl",
-        "features": 256,
-        "out_channels": (256, 512, 1024, 1024),
-    },
-    "vitg": {
-        "encoder": "vitg",
-        "features": 384,
-        "out_channels": (1536, 1536, 1536, 1536),
-    },
-}
-
-
-# Load the model at startup
-model = DepthModel(
-    "v2_vits",
-    device=device,
-    model_load_dir=Path(os.getcwd()) / "tmp/model-weights/",
-    grayscale=False,
+# Variants /predict can serve, e.g. "v2_vits" (fast) or "v2_vitl" (accurate);
+# the variant is part of the result cache key
+VARIANTS = config.DEPTH_VARIANTS
+DEFAULT_VARIANT = config.DEPTH_DEFAULT_VARIANT
+
+# Default network input size (see `select_resolution` for per-request ones);
+# also the smallest short side worth decoding uploads at
+INPUT_SIZE = DEFAULT_INPUT_SIZE
+
+COLORMAP = "viridis"
+
+# Settings that change the depth maps the served models produce
+DEPTH_SETTINGS = (
+    COLORMAP,
+    config.DEPTH_PREPROCESSING,
+    config.DEPTH_PRECISION,
+    config.DEPTH_FUSED_ATTENTION,
+    config.DEPTH_QUANTIZATION,
+    config.DEPTH_QUANTIZE_HEAD,
+    config.DEPTH_CALIBRATION_DIR,
+    config.DEPTH_RAGGED_BATCHING,
+    config.DEPTH_MAX_PAD_RATIO,
+    config.DEPTH_COMPILE,
+    config.DEPTH_BACKEND,
 )
 
 
+def model_key(variant: str) -> str:
+    """Registry name of a depth model variant."""
+    return f"depth:{variant}"
+
+
+def load_depth_model(variant: str) -> DepthModel:
+    calibration_images = None
+    if config.DEPTH_CALIBRATION_DIR:
+        calibration_images = load_images(config.DEPTH_CALIBRATION_DIR)
+
+    return DepthModel(
+        variant,
+        device=device,
+        model_load_dir=Path(os.getcwd()) / "tmp/model-weights/",
+        grayscale=False,
+        colormap=COLORMAP,
+        max_pad_ratio=config.DEPTH_MAX_PAD_RATIO,
+        ragged=config.DEPTH_RAGGED_BATCHING,
+        preprocessing=config.DEPTH_PREPROCESSING,
+        fast_load=config.DEPTH_FAST_LOAD,
+        precision=config.DEPTH_PRECISION,
+        fused_attention=config.DEPTH_FUSED_ATTENTION,
+        quantization=config.DEPTH_QUANTIZATION,
+        quantize_head=config.DEPTH_QUANTIZE_HEAD,
+        calibration_images=calibration_images,
+        warmup_shapes=config.DEPTH_WARMUP_SHAPES,
+        compile_mode=config.DEPTH_COMPILE,
+        compile_batch_sizes=config.DEPTH_COMPILE_BATCH_SIZES,
+        backend=config.DEPTH_BACKEND,
+    )
+
+
+# Loaded on first use; only the default variant is warmed up at startup.
+# Under MODEL_MEMORY_BUDGET_MB, idle variants are unloaded first.
+for _variant in VARIANTS:
+    registry.register(
+        model_key(_variant),
+        partial(load_depth_model, _variant),
+        size_fn=lambda model: model.memory_bytes,
+        warm=_variant == DEFAULT_VARIANT,
+    )
+
+
+def get_model(variant: str = DEFAULT_VARIANT) -> DepthModel:
+    return registry.get(model_key(variant))
+
+
+@dataclass
+class DepthRequest:
+    """
+    One image queued for depth prediction by the `variant` model at
+    `input_size`; `raw` asks for float depth instead of colors, `output_size`
+    for a (height, width) other than the image's.
+    """
+
+    image: np.ndarray
+    raw: bool = False
+    output_size: Optional[Tuple[int, int]] = None
+    variant: str = DEFAULT_VARIANT
+    input_size: int = INPUT_SIZE
+
+
+def depth_batch_key(request):
+    """
+    Batching key: images for the same variant and network input shape share a
+    forward pass. With ragged batching or DEPTH_MAX_PAD_RATIO, any images for
+    the same variant and input size share a batch, which `infer_images` then
+    packs or pads. Shapes only depend on the input size, so keys are computed
+    without waiting for the weights.
+    """
+    if config.DEPTH_RAGGED_BATCHING or config.DEPTH_MAX_PAD_RATIO > 0:
+        return request.variant, request.input_size
+    return (
+        request.variant,
+        request.input_size,
+        network_shape(*request.image.shape[:2], request.input_size),
+    )
+
+
 @torch.no_grad()
-def predict_depth(image_bytes_io):
-    try:
+def predict_depth_batch(requests):
+    # The batching key guarantees a single variant and input size per batch
+    model = get_model(requests[0].variant)
+    depths = model.infer_depth(
+        [r.image for r in requests],
+        return_tensors=True,
+        output_sizes=[r.output_size or r.image.shape[:2] for r in requests],
+        input_size=requests[0].input_size,
+    )
+
+    predictions = [None] * len(requests)
+
+    colored = [i for i, r in enumerate(requests) if not r.raw]
+    if colored:
+        colored_maps = model.postprocessor([depths[i] for i in colored])
+        for k, i in enumerate(colored):
+            predictions[i] = colored_maps[k]
+
+    for i, r in enumerate(requests):
+        if r.raw:
+            predictions[i] = depths[i].float().cpu().numpy()
 
-        img_array = np.frombuffer(image_bytes_io, dtype=np.uint8)
-        image = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+    logger.info(f"Predicted {len(predictions)} depth map(s)")
+    return predictions
 
-        prediction = model.infer([image])[0]
+
+@torch.no_grad()
+def predict_depth(image, output_size=None, variant=DEFAULT_VARIANT):
+    try:
+        prediction = predict_depth_batch(
+            [DepthRequest(image, output_size=output_size, variant=variant)]
+        )[0]
 
         # Log prediction details
         logger.info(f"Depth map shape: {prediction.shape}")
@@ -61,3 +166,24 @@ def predict_depth(image_bytes_io):
     except Exception as e:
         logger.error(f"Error in predict_depth: {e}")
         raise
+
+
+@torch.no_grad()
+def predict_depth_frames(
+    frames: List[np.ndarray],
+    smoother: RangeSmoother,
+    variant: str = DEFAULT_VARIANT,
+    input_size: int = INPUT_SIZE,
+) -> List[np.ndarray]:
+    """
+    Colorized depth for consecutive video frames, as one batch. Frames are
+    normalized to the stream's smoothed depth range instead of their own, so
+    colors stay stable from frame to frame.
+    """
+    model = get_model(variant)
+    depths = model.infer_depth(frames, return_tensors=True, input_size=input_size)
+
+    # Frames of one stream share a size; the ranges are applied in order
+    stacked = torch.stack(depths)
+    colored = model.postprocessor.colorize(stacked, smoother(stacked))
+    return list(colored.cpu().numpy())
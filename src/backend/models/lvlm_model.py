@@ -1,52 +1,183 @@
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
 from PIL import Image
 from typing import List
 import io
 import logging
 import dotenv
 import os
-from huggingface_hub import login
 
 from PIL import Image
 
 import time
 
+from src.backend.models.registry import registry
+
 # Load environment variables from .env
 dotenv.load_dotenv()
 
-hf_token = os.getenv('HUGGING_FACE_TOKEN')
-if hf_token:
-    try:
-        login(token=hf_token)
-        print("Successfully logged into Hugging Face.")
-    except Exception as e:
-        print(f"Failed to log into Hugging Face: {e}")
-        # Handle the error as needed
-else:
-    print("Hugging Face token not provided. Skipping login.")
-
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load model at startup
 device = 'cuda' if torch.cuda.is_available() else 'cpu'
 model_name = 'RussRobin/SpatialBot-3B'
 
-logger.info(f"Loading model '{model_name}' on device '{device}'...")
-model = AutoModelForCausalLM.from_pretrained(
-    model_name,
-    torch_dtype=torch.float16 if device == 'cuda' else torch.float32,
-    device_map='auto',
-    trust_remote_code=True
-)
-tokenizer = AutoTokenizer.from_pretrained(
-    model_name,
-    trust_remote_code=True
+
+def load_lvlm():
+    """Log into Hugging Face and load the model and tokenizer."""
+    # Imported here so replicas that do not serve the LVLM never load them
+    from huggingface_hub import login
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    hf_token = os.getenv('HUGGING_FACE_TOKEN')
+    if hf_token:
+        try:
+            login(token=hf_token)
+            print("Successfully logged into Hugging Face.")
+        except Exception as e:
+            print(f"Failed to log into Hugging Face: {e}")
+            # Handle the error as needed
+    else:
+        print("Hugging Face token not provided. Skipping login.")
+
+    logger.info(f"Loading model '{model_name}' on device '{device}'...")
+    model = AutoModelForCausalLM.from_pretrained(
+        model_name,
+        torch_dtype=torch.float16 if device == 'cuda' else torch.float32,
+        device_map='auto',
+        trust_remote_code=True
+    )
+    tokenizer = AutoTokenizer.from_pretrained(
+        model_name,
+        trust_remote_code=True
+    )
+
+    logger.info("Model loaded successfully.")
+    return model, tokenizer
+
+
+# Loaded on first use (or by the registry's startup warm-up)
+registry.register("lvlm", load_lvlm)
+
+# The prompt is "<SYSTEM_PROMPT>USER: <image 1>\n<image 2>\n<question> ASSISTANT:";
+# everything up to the image tokens is the same for every question
+SYSTEM_PROMPT = (
+    "A chat between a curious user and an artificial intelligence assistant. "
+    "The assistant gives helpful, detailed, and polite answers to the user's questions. "
 )
+IMAGE_TOKEN_IDS = [-201, -202]
+MAX_NEW_TOKENS = 100
+
+
+def process_images(images: List[Image.Image]):
+    """RGB image and depth map -> image tensor on the model device."""
+    logger.info("Processing images...")
+    model, _ = registry.get("lvlm")
+    return model.process_images(images, model.config).to(dtype=model.dtype, device=device)
+
+
+def prefix_ids():
+    """Token ids of the system prompt and the two image placeholders."""
+    _, tokenizer = registry.get("lvlm")
+    return tokenizer(f"{SYSTEM_PROMPT}USER: ").input_ids + IMAGE_TOKEN_IDS
+
+
+def question_ids(prompt: str):
+    """Token ids of the part of the prompt that changes per question."""
+    _, tokenizer = registry.get("lvlm")
+    return tokenizer(f"{prompt} ASSISTANT:").input_ids
+
+
+@torch.no_grad()
+def prefill_prefix(image_tensor):
+    """
+    Run the prompt prefix (system prompt + image tokens) once.
+
+    Returns the KV cache and its length in tokens, to be resumed by
+    `generate_from_prefix` for any number of questions about the images.
+    """
+    model, _ = registry.get("lvlm")
+    input_ids = torch.tensor(prefix_ids(), dtype=torch.long, device=device).unsqueeze(0)
+    outputs = model(input_ids=input_ids, images=image_tensor, use_cache=True)
+    past_key_values = outputs.past_key_values
+
+    if hasattr(past_key_values, "get_seq_length"):
+        prefix_len = past_key_values.get_seq_length()
+    else:
+        prefix_len = past_key_values[0][0].shape[-2]
+
+    return past_key_values, prefix_len
+
+
+@torch.no_grad()
+def generate_from_prefix(past_key_values, prefix_len: int, prompt: str) -> str:
+    """
+    Greedy decoding of the answer to `prompt`, continuing from a prefilled
+    prefix, so only the question and answer tokens are run.
+
+    A `DynamicCache` is extended in place while decoding and cropped back to
+    `prefix_len` afterwards; callers must not share it between threads.
+    """
+    model, tokenizer = registry.get("lvlm")
+    input_ids = torch.tensor(question_ids(prompt), dtype=torch.long, device=device).unsqueeze(0)
+    past = past_key_values
+    generated = []
+
+    try:
+        for _ in range(MAX_NEW_TOKENS):
+            outputs = model(input_ids=input_ids, past_key_values=past, use_cache=True)
+            past = outputs.past_key_values
+
+            next_id = outputs.logits[0, -1].argmax().item()
+            if next_id == tokenizer.eos_token_id:
+                break
+
+            generated.append(next_id)
+            input_ids = torch.tensor([[next_id]], dtype=torch.long, device=device)
+    finally:
+        if hasattr(past_key_values, "crop"):
+            past_key_values.crop(prefix_len)
+
+    return tokenizer.decode(generated, skip_special_tokens=True).strip()
+
+
+def respond_in_session(session, prompt: str):
+    """
+    Answer `prompt` about a session's images, resuming its prefix KV cache.
+
+    Falls back to a full `model.generate` over the session's processed image
+    tensor (and stops reusing the KV cache) if resuming fails.
+    """
+    with session.lock:
+        try:
+            if session.prefix_kv is not None:
+                response_text = generate_from_prefix(
+                    session.prefix_kv, session.prefix_len, prompt
+                )
+                logger.info(f"Generated response: {response_text}")
+                return {"response": response_text}
+        except Exception as e:
+            logger.warning(f"KV cache reuse failed, falling back to full generation: {e}")
+            session.prefix_kv = None
+
+    return generate_with_images(prompt, session.image_tensor)
+
+
+def prepare_session(images: List[Image.Image]):
+    """
+    Per-image-pair LVLM state: (image tensor, prefix KV cache, prefix length).
+    The KV cache is None when the prefix could not be prefilled on its own.
+    """
+    image_tensor = process_images(images)
+
+    try:
+        prefix_kv, prefix_len = prefill_prefix(image_tensor)
+    except Exception as e:
+        logger.warning(f"Prefix prefill failed, questions will run in full: {e}")
+        prefix_kv, prefix_len = None, 0
+
+    return image_tensor, prefix_kv, prefix_len
 
-logger.info("Model loaded successfully.")
 
 # @app.post("/analyze")
 def generate_response(prompt: str, images: List[Image.Image]):
@@ -56,29 +187,34 @@ def generate_response(prompt: str, images: List[Image.Image]):
     Expects two images: RGB image and Depth map.
     """
 
+    if len(images) != 2:
+        logger.error("Incorrect number of images received.")
+        return {"error": "Two images (RGB and Depth map) are required."}
+
     try:
-        if len(images) != 2:
-            logger.error("Incorrect number of images received.")
-            return {"error": "Two images (RGB and Depth map) are required."}
+        image_tensor = process_images(images)
+    except Exception as e:
+        logger.error(f"Error in generate_response: {e}")
+        return {"error": str(e)}
+
+    return generate_with_images(prompt, image_tensor)
+
 
-        global model
-        # Process images
-        logger.info("Processing images...")
-        image_tensor = model.process_images(images, model.config).to(dtype=model.dtype, device=device)
+def generate_with_images(prompt: str, image_tensor):
+    """Full prefill and generation for `prompt` over an already processed image tensor."""
+
+    try:
+        model, tokenizer = registry.get("lvlm")
 
         # Construct the prompt
-        text = (
-            "A chat between a curious user and an artificial intelligence assistant. "
-            "The assistant gives helpful, detailed, and polite answers to the user's questions. "
-            f"USER: <image 1>\n<image 2>\n{prompt} ASSISTANT:"
-        )
+        text = f"{SYSTEM_PROMPT}USER: <image 1>\n<image 2>\n{prompt} ASSISTANT:"
         logger.info(f"Constructed prompt: {text}")
 
 
         # Tokenize the prompt
         text_chunks = [tokenizer(chunk).input_ids for chunk in text.split('<image 1>\n<image 2>\n')]
         input_ids = torch.tensor(
-            text_chunks[0] + [-201] + [-202] + text_chunks[1],
+            text_chunks[0] + IMAGE_TOKEN_IDS + text_chunks[1],
             dtype=torch.long
         ).unsqueeze(0).to(device)
 
@@ -93,7 +229,7 @@ def generate_response(prompt: str, images: List[Image.Image]):
         output_ids = model.generate(
             input_ids,
             images=image_tensor,
-            max_new_tokens=100,
+            max_new_tokens=MAX_NEW_TOKENS,
             use_cache=True,
             repetition_penalty=1.0
         )[0]
@@ -0,0 +1,212 @@
+# src/backend/models/registry.py
+
+import gc
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from loguru import logger
+
+from src.backend import config
+
+
+class ModelNotServedError(RuntimeError):
+    """Raised when a model is requested that this deployment does not serve."""
+
+
+class ModelLoadError(RuntimeError):
+    """Raised when a model failed to load (e.g. its weights are missing)."""
+
+
+@dataclass
+class _ModelSlot:
+    loader: Callable[[], Any]
+    size_fn: Optional[Callable[[Any], int]] = None
+    warm: bool = True
+    state: str = "not_loaded"  # not_loaded | loading | ready | failed
+    value: Any = None
+    error: Optional[str] = None
+    load_s: Optional[float] = None
+    failed_at: float = 0.0
+    nbytes: int = 0  # measured at the last load; kept after eviction
+    last_used: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+class ModelRegistry:
+    """
+    Models loaded on first use instead of at import.
+
+    Model modules `register` a loader under a name; `get` runs it once
+    (concurrent callers wait for the same load) and returns the cached
+    result. Only the names in `served` can be loaded, so a deployment that
+    does not serve a model never pays for it; a name "group:variant" is also
+    served when its group is. `warm_up` loads the served models on
+    background threads, and `status` reports per-model readiness.
+
+    With a `memory_budget` (bytes), loaded models are measured with their
+    `size_fn` and the least recently used ones are unloaded to keep the
+    total under budget. A model's size is only known once it has been
+    loaded, so the first load of a variant may overshoot until it is
+    measured; requests already holding an evicted model finish with it.
+    """
+
+    def __init__(
+        self,
+        served: Optional[Iterable[str]] = None,
+        memory_budget: Optional[int] = None,
+        retry_after_s: float = 30.0,
+    ):
+        self.served = set(served) if served is not None else None
+        self.memory_budget = memory_budget
+        # A failed load is retried at most this often, not on every request
+        self.retry_after_s = retry_after_s
+        self._slots: Dict[str, _ModelSlot] = {}
+        self._budget_lock = threading.Lock()
+        self.evictions = 0
+
+    def register(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        size_fn: Optional[Callable[[Any], int]] = None,
+        warm: bool = True,
+    ) -> None:
+        """`warm=False` leaves the model out of `warm_up` (loaded on first use only)."""
+        self._slots[name] = _ModelSlot(loader, size_fn=size_fn, warm=warm)
+
+    def is_served(self, name: str) -> bool:
+        if name not in self._slots:
+            return False
+        group = name.split(":", 1)[0]
+        return self.served is None or name in self.served or group in self.served
+
+    def is_ready(self, name: str) -> bool:
+        slot = self._slots.get(name)
+        return slot is not None and slot.state == "ready"
+
+    def get(self, name: str) -> Any:
+        if not self.is_served(name):
+            raise ModelNotServedError(f"Model {name!r} is not served by this deployment.")
+
+        slot = self._slots[name]
+        slot.last_used = time.monotonic()
+
+        value = slot.value
+        if slot.state == "ready" and value is not None:
+            return value
+
+        with slot.lock:
+            value = slot.value
+            if slot.state != "ready" or value is None:
+                if (
+                    slot.state == "failed"
+                    and time.monotonic() - slot.failed_at < self.retry_after_s
+                ):
+                    raise ModelLoadError(f"Model {name!r} failed to load: {slot.error}")
+                value = self._load(name, slot)
+            return value
+
+    def warm_up(self) -> None:
+        """Load every served model in the background."""
+        for name, slot in self._slots.items():
+            if self.is_served(name) and slot.warm and slot.state == "not_loaded":
+                threading.Thread(
+                    target=self._warm_up_one, args=(name,), name=f"load-{name}", daemon=True
+                ).start()
+
+    def ready(self) -> bool:
+        """Whether every served model that is warmed up at startup is loaded."""
+        return all(
+            self.is_ready(name)
+            for name, slot in self._slots.items()
+            if self.is_served(name) and slot.warm
+        )
+
+    def status(self) -> dict:
+        return {
+            name: {
+                "served": self.is_served(name),
+                "state": slot.state,
+                "load_s": slot.load_s,
+                "nbytes": slot.nbytes,
+                "error": slot.error,
+            }
+            for name, slot in self._slots.items()
+        }
+
+    def memory(self) -> dict:
+        return {
+            "budget": self.memory_budget,
+            "loaded": self._loaded_bytes(),
+            "evictions": self.evictions,
+        }
+
+    def _load(self, name: str, slot: _ModelSlot) -> Any:
+        logger.info(f"Loading model {name!r}...")
+        self._make_room(name, slot.nbytes)
+        slot.state = "loading"
+        started = time.perf_counter()
+
+        try:
+            value = slot.value = slot.loader()
+        except Exception as e:
+            # Retryable after `retry_after_s`
+            slot.state, slot.error = "failed", str(e)
+            slot.failed_at = time.monotonic()
+            logger.error(f"Failed to load model {name!r}: {e}")
+            raise ModelLoadError(f"Model {name!r} failed to load: {e}") from e
+
+        slot.load_s = round(time.perf_counter() - started, 3)
+        if slot.size_fn is not None:
+            slot.nbytes = slot.size_fn(slot.value)
+        slot.state, slot.error = "ready", None
+        logger.info(f"Model {name!r} loaded in {slot.load_s:.1f} s")
+
+        self._make_room(name, 0)
+        return value
+
+    def _loaded_bytes(self) -> int:
+        return sum(slot.nbytes for slot in self._slots.values() if slot.state == "ready")
+
+    def _make_room(self, name: str, nbytes: int) -> None:
+        """Unload least recently used models until `nbytes` more fit in the budget."""
+        if not self.memory_budget:
+            return
+
+        with self._budget_lock:
+            evicted = False
+            while self._loaded_bytes() + nbytes > self.memory_budget:
+                candidates = [
+                    (slot.last_used, other)
+                    for other, slot in self._slots.items()
+                    if other != name and slot.state == "ready"
+                ]
+                if not candidates:
+                    logger.warning(
+                        f"Model {name!r} does not fit in the memory budget "
+                        f"({self.memory_budget} bytes)"
+                    )
+                    break
+
+                _, victim = min(candidates)
+                slot = self._slots[victim]
+                slot.state, slot.value = "not_loaded", None
+                self.evictions += 1
+                evicted = True
+                logger.info(f"Unloaded model {victim!r} to stay within the memory budget")
+
+            if evicted:
+                gc.collect()
+
+    def _warm_up_one(self, name: str) -> None:
+        try:
+            self.get(name)
+        except Exception:
+            pass  # recorded in status()
+
+
+registry = ModelRegistry(
+    config.SERVED_MODELS, memory_budget=config.MODEL_MEMORY_BUDGET_BYTES
+)
@@ -0,0 +1,116 @@
+# src/backend/sessions.py
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+import numpy as np
+
+from src.backend.encoding import EncodedImage
+from src.backend.singleflight import SingleFlight
+
+
+@dataclass
+class DepthGPTSession:
+    """
+    Everything /depthgpt derives from one photo that does not depend on the
+    question: the depth map and both response images (encoded), the LVLM's
+    processed image tensor and the KV cache of the prompt prefix (system
+    prompt + image tokens), with its length in tokens.
+
+    `lock` serializes questions on the session, since decoding extends the
+    KV cache in place.
+    """
+
+    depth_map: np.ndarray
+    encoded_depth: EncodedImage
+    encoded_rgb: EncodedImage
+    image_tensor: Any
+    prefix_kv: Any = None
+    prefix_len: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+class SessionStore:
+    """
+    Bounded LRU of DepthGPT sessions keyed by image pair.
+
+    Holds at most `max_sessions` sessions (each pins a prefix KV cache in
+    model memory); sessions idle for longer than `ttl_s` are dropped on the
+    next access. Concurrent requests creating the same session share one
+    `create` call.
+    """
+
+    def __init__(self, max_sessions: int, ttl_s: Optional[float] = None):
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+
+        self._sessions: "OrderedDict[str, tuple[float, DepthGPTSession]]" = OrderedDict()
+        self._flights = SingleFlight()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[DepthGPTSession]:
+        self._expire()
+
+        item = self._sessions.get(key)
+        if item is None:
+            return None
+
+        self._sessions[key] = (time.monotonic(), item[1])
+        self._sessions.move_to_end(key)
+        return item[1]
+
+    def put(self, key: str, session: DepthGPTSession) -> None:
+        if self.max_sessions <= 0:
+            return
+
+        self._sessions[key] = (time.monotonic(), session)
+        self._sessions.move_to_end(key)
+
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_create(
+        self, key: str, create: Callable[[], Awaitable[DepthGPTSession]]
+    ) -> tuple[DepthGPTSession, bool]:
+        """Session for `key`, created on a miss. Returns (session, hit)."""
+        session = self.get(key)
+        if session is not None:
+            self.hits += 1
+            return session, True
+
+        async def load() -> DepthGPTSession:
+            self.misses += 1
+            session = await create()
+            self.put(key, session)
+            return session
+
+        return await self._flights.run(key, load)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self._flights.coalesced,
+            "evictions": self.evictions,
+        }
+
+    def _expire(self) -> None:
+        if not self.ttl_s:
+            return
+
+        deadline = time.monotonic() - self.ttl_s
+        while self._sessions:
+            key, (last_used, _) = next(iter(self._sessions.items()))
+            if last_used >= deadline:
+                break
+            del self._sessions[key]
+            self.evictions += 1
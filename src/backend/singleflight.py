@@ -0,0 +1,41 @@
+# src/backend/singleflight.py
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent async computations by key.
+
+    While `run(key, compute)` is computing, further calls for the same key
+    await that result (or exception) instead of computing again; they are
+    counted in `coalesced`. The computation runs as its own task, so a
+    cancelled caller (e.g. a disconnected client) only stops waiting; the
+    others still get the result.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def run(
+        self, key: Hashable, compute: Callable[[], Awaitable[Any]]
+    ) -> tuple[Any, bool]:
+        """Result of `compute` for `key`. Returns (result, coalesced)."""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task), True
+
+        task = asyncio.get_running_loop().create_task(compute())
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task), False
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Retrieve it so a failure nobody awaited is not reported as never retrieved
+            task.exception()
@@ -0,0 +1,81 @@
+# src/backend/streaming.py
+
+import asyncio
+from collections import deque
+from typing import List, Tuple
+
+import numpy as np
+
+
+class FrameQueue:
+    """
+    Decoded frames of one video stream waiting for depth inference.
+
+    At most `max_pending` frames wait; when inference falls behind, the
+    oldest waiting frame is dropped for each new one (counted in `skipped`),
+    so the stream stays close to live instead of building up latency.
+    `next_batch` hands out up to `max_batch_size` consecutive frames of
+    equal size, in arrival order; batches never exceed `max_pending`, so it
+    must be at least `max_batch_size`.
+    """
+
+    def __init__(self, max_pending: int = 4, max_batch_size: int = 4):
+        if max_pending < 1 or max_batch_size < 1:
+            raise ValueError("max_pending and max_batch_size must be at least 1.")
+        if max_pending < max_batch_size:
+            raise ValueError(
+                f"max_pending ({max_pending}) must be at least max_batch_size "
+                f"({max_batch_size}): a batch only takes waiting frames."
+            )
+
+        self.max_pending = max_pending
+        self.max_batch_size = max_batch_size
+
+        self._frames = deque()
+        self._available = asyncio.Event()
+        self._closed = False
+
+        self.received = 0
+        self.skipped = 0
+
+    def push(self, index: int, frame: np.ndarray) -> None:
+        self.received += 1
+        if len(self._frames) >= self.max_pending:
+            self._frames.popleft()
+            self.skipped += 1
+        self._frames.append((index, frame))
+        self._available.set()
+
+    def close(self, drop_pending: bool = False) -> None:
+        """
+        No more frames: `next_batch` drains what is left (nothing with
+        `drop_pending`, e.g. once the client is gone), then returns [].
+        """
+        if drop_pending:
+            self._frames.clear()
+        self._closed = True
+        self._available.set()
+
+    async def next_batch(self) -> List[Tuple[int, np.ndarray]]:
+        while not self._frames:
+            if self._closed:
+                return []
+            self._available.clear()
+            await self._available.wait()
+
+        shape = self._frames[0][1].shape
+        batch = []
+        while (
+            self._frames
+            and len(batch) < self.max_batch_size
+            and self._frames[0][1].shape == shape
+        ):
+            batch.append(self._frames.popleft())
+        return batch
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "skipped": self.skipped,
+            "pending": len(self._frames),
+        }
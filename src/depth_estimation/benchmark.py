@@ -0,0 +1,157 @@
+import argparse
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+import torch
+
+from .estimation_model import DepthModel
+from .images import load_images
+
+
+def _timed_depths(infer: Callable, images: List[np.ndarray], warmup: int):
+    for image in images[:warmup]:
+        infer(image)
+
+    depths, times_ms = [], []
+    for image in images:
+        started = time.perf_counter()
+        depths.append(infer(image))
+        times_ms.append((time.perf_counter() - started) * 1000)
+    return depths, times_ms
+
+
+def compare_models(
+    reference: DepthModel | Callable,
+    candidate: DepthModel | Callable,
+    images: List[np.ndarray],
+    warmup: int = 1,
+) -> Dict[str, float]:
+    """
+    Accuracy and speed of `candidate` against `reference` on sample images.
+
+    Either may be a DepthModel or a callable mapping a BGR image to a float
+    depth map. Errors are absolute depth differences divided by the
+    reference map's range (so 0.01 is 1% of the scene's depth range),
+    averaged per image; latencies are per image, one image at a time.
+    """
+
+    def as_callable(model):
+        if isinstance(model, DepthModel):
+            return lambda image: model.infer_depth([image])[0]
+        return model
+
+    with torch.no_grad():
+        expected, reference_ms = _timed_depths(as_callable(reference), images, warmup)
+        actual, candidate_ms = _timed_depths(as_callable(candidate), images, warmup)
+
+    mean_errors, p99_errors = [], []
+    for r, c in zip(expected, actual):
+        r, c = np.asarray(r, dtype=np.float32), np.asarray(c, dtype=np.float32)
+        error = np.abs(c - r) / max(float(r.max() - r.min()), 1e-6)
+        mean_errors.append(float(error.mean()))
+        p99_errors.append(float(np.percentile(error, 99)))
+
+    reference_median = statistics.median(reference_ms)
+    candidate_median = statistics.median(candidate_ms)
+
+    return {
+        "images": len(images),
+        "mean_error": statistics.mean(mean_errors),
+        "p99_error": max(p99_errors),
+        "reference_ms": reference_median,
+        "candidate_ms": candidate_median,
+        "speedup": reference_median / candidate_median,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare a quantized, reduced-precision, ONNX Runtime or "
+        "otherwise optimized DepthModel against the fp32 torch reference."
+    )
+    parser.add_argument("images", type=Path, help="Directory of sample images")
+    parser.add_argument("--model", default="v2_vits")
+    parser.add_argument("--weights-dir", type=Path, default=Path("tmp/model-weights"))
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--precision", default="fp32", help="fp32, bf16 or fp16")
+    parser.add_argument("--quantization", default="none")
+    parser.add_argument(
+        "--preprocessing",
+        default="default",
+        help="default, fused or torch (checked against the default transforms)",
+    )
+    parser.add_argument(
+        "--backend",
+        default="torch",
+        help="torch, or onnx (parity of an exported model, see onnx_export)",
+    )
+    parser.add_argument("--onnx-path", type=Path, default=None)
+    parser.add_argument("--quantize-head", action="store_true")
+    parser.add_argument(
+        "--calibration-images",
+        type=int,
+        default=8,
+        help="Images used to calibrate static quantization (excluded from the comparison)",
+    )
+    parser.add_argument(
+        "--attention-parity",
+        action="store_true",
+        help="Compare fused (SDPA) attention against the explicit softmax(q @ k^T) path",
+    )
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=None,
+        help="Exit with an error when the mean error exceeds this (e.g. 0.01)",
+    )
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit)
+    calibration, samples = images[: args.calibration_images], images[args.calibration_images :]
+    if args.quantization != "static" and not args.quantize_head:
+        calibration, samples = [], images
+
+    reference = DepthModel(
+        args.model,
+        args.device,
+        args.weights_dir,
+        fused_attention=not args.attention_parity,
+    )
+    candidate = DepthModel(
+        args.model,
+        args.device,
+        args.weights_dir,
+        precision=args.precision,
+        quantization=args.quantization,
+        quantize_head=args.quantize_head,
+        calibration_images=calibration,
+        preprocessing=args.preprocessing,
+        backend=args.backend,
+        onnx_path=args.onnx_path,
+    )
+
+    results = compare_models(reference, candidate, samples)
+    results["reference_mb"] = reference.memory_bytes / 2**20
+    results["candidate_mb"] = candidate.memory_bytes / 2**20
+
+    if args.preprocessing != "default":
+        preprocessor = candidate.model.get_preprocessor(mode=args.preprocessing)
+        errors = [preprocessor.compare_to_reference(image) for image in samples]
+        results["input_max_error"] = max(e["max"] for e in errors)
+        results["input_mean_error"] = statistics.mean(e["mean"] for e in errors)
+
+    for name, value in results.items():
+        print(f"{name:>14}: {value:.4f}" if isinstance(value, float) else f"{name:>14}: {value}")
+
+    if args.tolerance is not None and results["mean_error"] > args.tolerance:
+        raise SystemExit(
+            f"Mean error {results['mean_error']:.4f} exceeds tolerance {args.tolerance}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import logging
+import threading
+from typing import Iterable, Tuple
+
+import torch
+
+from .depth_anything.dpt import DepthAnything
+
+logger = logging.getLogger(__name__)
+
+# "none": eager; "trace": one TorchScript graph per input shape;
+# "compile": torch.compile (dynamic=False), specialized per input shape
+COMPILE_MODES = ("none", "trace", "compile")
+
+
+class CompiledForward:
+    """
+    Shape-specialized `DepthAnything.forward`.
+
+    Graphs are built ahead of time by `warm_up` for the (batch, 3, H, W)
+    input shapes the deployment expects and kept by shape, at most
+    `max_graphs` of them (torch.compile keeps 8 per function by default).
+    Any other shape runs the eager forward, so an
+    unexpected resolution never stalls a request on a compilation.
+    """
+
+    def __init__(self, model: DepthAnything, mode: str = "trace", max_graphs: int = 8):
+        if mode not in COMPILE_MODES or mode == "none":
+            raise ValueError(
+                f"Unknown compile mode {mode!r}, expected one of {COMPILE_MODES[1:]}."
+            )
+        if mode == "compile" and not hasattr(torch, "compile"):
+            raise ValueError("torch.compile needs PyTorch 2.0 or newer.")
+
+        self.model = model
+        self.mode = mode
+        self.max_graphs = max_graphs
+        self.graphs = {}
+        self.hits = 0
+        self.misses = 0
+
+        self._compiled = None
+        self._lock = threading.Lock()
+
+    def _build(self, example: torch.Tensor):
+        if self.mode == "trace":
+            # The traced graph shares the model's parameters
+            return torch.jit.trace(self.model, example, check_trace=False)
+
+        # Dynamo guards on the shape; one compiled function serves every
+        # warmed shape without recompiling
+        if self._compiled is None:
+            self._compiled = torch.compile(self.model, dynamic=False)
+        self._compiled(example)
+        return self._compiled
+
+    @torch.no_grad()
+    def warm_up(self, shapes: Iterable[Tuple[int, int, int]]) -> "CompiledForward":
+        """Build graphs for (batch size, height, width) network inputs."""
+        device = self.model.pretrained.cls_token.device
+
+        for batch, height, width in shapes:
+            key = (batch, 3, height, width)
+            with self._lock:
+                if key in self.graphs:
+                    continue
+                if len(self.graphs) >= self.max_graphs:
+                    logger.warning(
+                        "Not compiling %s: already holding %d graphs", key, self.max_graphs
+                    )
+                    continue
+
+                example = torch.zeros(key, device=device)
+                try:
+                    self.graphs[key] = self._build(example)
+                except Exception:
+                    logger.exception("Compiling the depth model for %s failed", key)
+        return self
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        graph = self.graphs.get(tuple(x.shape))
+        if graph is None:
+            self.misses += 1
+            return self.model(x)
+
+        self.hits += 1
+        return graph(x)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "shapes": [list(key) for key in self.graphs],
+            "hits": self.hits,
+            "misses": self.misses,
+        }
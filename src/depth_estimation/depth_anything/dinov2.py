@@ -9,6 +9,8 @@
 
 import logging
 import math
+import threading
+from collections import OrderedDict
 from functools import partial
 from typing import Callable, Sequence, Tuple, Union
 
@@ -23,6 +25,10 @@ from .dinov2_layers import PatchEmbed, SwiGLUFFNFused
 
 logger = logging.getLogger("dinov2")
 
+# Guards `pos_embed_cache`, which depth worker threads share; module-level
+# so models stay deep-copyable
+_pos_embed_cache_lock = threading.Lock()
+
 
 def named_apply(
     fn: Callable, module: nn.Module, name="", depth_first=True, include_root=False
@@ -114,6 +120,12 @@ class DinoVisionTransformer(nn.Module):
         self.interpolate_antialias = interpolate_antialias
         self.interpolate_offset = interpolate_offset
 
+        # Interpolated positional embeddings by (patch_h, patch_w, dtype, device),
+        # least recently used first; see `interpolate_pos_encoding`
+        self.pos_embed_cache = OrderedDict()
+        self.pos_embed_cache_size = 32
+        self._pos_embed_cache_source = None
+
         self.patch_embed = embed_layer(
             img_size=img_size,
             patch_size=patch_size,
@@ -136,8 +148,10 @@ class DinoVisionTransformer(nn.Module):
         if drop_path_uniform is True:
             dpr = [drop_path_rate] * depth
         else:
+            # On CPU explicitly: .item() must work under a meta device context
             dpr = [
-                x.item() for x in torch.linspace(0, drop_path_rate, depth)
+                x.item()
+                for x in torch.linspace(0, drop_path_rate, depth, device="cpu")
             ]  # stochastic depth decay rule
 
         if ffn_layer == "mlp":
@@ -201,17 +215,61 @@ class DinoVisionTransformer(nn.Module):
         named_apply(init_weights_vit_timm, self)
 
     def interpolate_pos_encoding(self, x, w, h):
-        previous_dtype = x.dtype
         npatch = x.shape[1] - 1
         N = self.pos_embed.shape[1] - 1
         if npatch == N and w == h:
             return self.pos_embed
+        # Inputs are (B, C, H, W); `w` and `h` follow the upstream naming
+        patch_h, patch_w = w // self.patch_size, h // self.patch_size
+
+        if torch.onnx.is_in_onnx_export():
+            # Interpolate to the traced grid size, so exported graphs keep
+            # dynamic height and width
+            return self._interpolate_pos_embed(patch_h, patch_w, x.dtype, by_size=True)
+        if torch.is_grad_enabled() and self.pos_embed.requires_grad:
+            return self._interpolate_pos_embed(patch_h, patch_w, x.dtype)
+        return self.cached_pos_embed(patch_h, patch_w, x.dtype, x.device)
+
+    def cached_pos_embed(self, patch_h, patch_w, dtype=None, device=None):
+        """
+        Positional embedding for a patch_h x patch_w grid, interpolated once
+        and kept in a bounded LRU cache. The cache resets whenever `pos_embed`
+        is replaced or modified (weight loading, `.to()`, precision casts).
+        """
+        dtype = dtype or self.pos_embed.dtype
+        device = device or self.pos_embed.device
+
+        key = (patch_h, patch_w, dtype, device)
+        source = (self.pos_embed.data_ptr(), self.pos_embed._version)
+
+        with _pos_embed_cache_lock:
+            if (
+                self._pos_embed_cache_source is None
+                or self._pos_embed_cache_source[0] is not self.pos_embed
+                or self._pos_embed_cache_source[1:] != source
+            ):
+                self.pos_embed_cache.clear()
+                self._pos_embed_cache_source = (self.pos_embed, *source)
+
+            pos_embed = self.pos_embed_cache.get(key)
+            if pos_embed is not None:
+                self.pos_embed_cache.move_to_end(key)
+                return pos_embed
+
+            with torch.no_grad():
+                pos_embed = self._interpolate_pos_embed(patch_h, patch_w, dtype).to(device)
+            self.pos_embed_cache[key] = pos_embed
+            if len(self.pos_embed_cache) > self.pos_embed_cache_size:
+                self.pos_embed_cache.popitem(last=False)
+            return pos_embed
+
+    def _interpolate_pos_embed(self, patch_h, patch_w, dtype, by_size=False):
         pos_embed = self.pos_embed.float()
         class_pos_embed = pos_embed[:, 0]
         patch_pos_embed = pos_embed[:, 1:]
-        dim = x.shape[-1]
-        w0 = w // self.patch_size
-        h0 = h // self.patch_size
+        N = patch_pos_embed.shape[1]
+        dim = patch_pos_embed.shape[-1]
+        w0, h0 = patch_h, patch_w
         # we add a small number to avoid floating point error in the interpolation
         # see discussion at https://github.com/facebookresearch/dino/issues/8
         # DINOv2 with register modify the interpolate_offset from 0.1 to 0.0
@@ -224,17 +282,22 @@ class DinoVisionTransformer(nn.Module):
             patch_pos_embed.reshape(1, int(sqrt_N), int(sqrt_N), dim).permute(
                 0, 3, 1, 2
             ),
-            scale_factor=(sx, sy),
+            **(
+                {"size": (patch_h, patch_w)}
+                if by_size
+                else {"scale_factor": (sx, sy)}
+            ),
             # (int(w0), int(h0)), # to solve the upsampling shape issue
             mode="bicubic",
             antialias=self.interpolate_antialias,
         )
 
-        assert int(w0) == patch_pos_embed.shape[-2]
-        assert int(h0) == patch_pos_embed.shape[-1]
+        if not by_size:
+            assert int(w0) == patch_pos_embed.shape[-2]
+            assert int(h0) == patch_pos_embed.shape[-1]
         patch_pos_embed = patch_pos_embed.permute(0, 2, 3, 1).view(1, -1, dim)
         return torch.cat((class_pos_embed.unsqueeze(0), patch_pos_embed), dim=1).to(
-            previous_dtype
+            dtype
         )
 
     def prepare_tokens_with_masks(self, x, masks=None):
@@ -317,6 +380,51 @@ class DinoVisionTransformer(nn.Module):
         ), f"only {len(output)} / {len(blocks_to_take)} blocks found"
         return output
 
+    def _get_intermediate_layers_list(self, x_list, n=1):
+        # Each block runs the token sequences of all inputs packed together
+        # (block-diagonal attention), see NestedTensorBlock.forward_nested
+        x = [self.prepare_tokens_with_masks(x) for x in x_list]
+        output, total_block_len = [], len(self.blocks)
+        blocks_to_take = (
+            range(total_block_len - n, total_block_len) if isinstance(n, int) else n
+        )
+        for i, blk in enumerate(self.blocks):
+            x = blk(x)
+            if i in blocks_to_take:
+                output.append(x)
+        assert len(output) == len(
+            blocks_to_take
+        ), f"only {len(output)} / {len(blocks_to_take)} blocks found"
+        return output
+
+    def get_intermediate_layers_list(
+        self,
+        x_list,
+        n: Union[int, Sequence] = 1,
+        return_class_token: bool = False,
+        norm=True,
+    ):
+        """
+        `get_intermediate_layers` for a list of (B_i, 3, H_i, W_i) batches of
+        different resolutions, run as one ragged forward; returns one result
+        per batch, as `get_intermediate_layers` would for it alone.
+        """
+        assert not self.chunked_blocks, "chunked blocks are not supported for lists"
+        layers = self._get_intermediate_layers_list(x_list, n)
+
+        results = []
+        for j in range(len(x_list)):
+            outputs = [layer[j] for layer in layers]
+            if norm:
+                outputs = [self.norm(out) for out in outputs]
+            class_tokens = [out[:, 0] for out in outputs]
+            outputs = [out[:, 1 + self.num_register_tokens :] for out in outputs]
+            if return_class_token:
+                results.append(tuple(zip(outputs, class_tokens)))
+            else:
+                results.append(tuple(outputs))
+        return results
+
     def _get_intermediate_layers_chunked(self, x, n=1):
         x = self.prepare_tokens_with_masks(x)
         output, i, total_block_len = [], 0, len(self.blocks[-1])
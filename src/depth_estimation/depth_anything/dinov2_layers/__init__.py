@@ -4,7 +4,7 @@
 # This source code is licensed under the license found in the
 # LICENSE file in the root directory of this source tree.
 
-from .attention import MemEffAttention
+from .attention import MemEffAttention, set_fused_attention
 from .block import NestedTensorBlock
 from .mlp import Mlp
 from .patch_embed import PatchEmbed
@@ -9,11 +9,18 @@
 #   https://github.com/rwightman/pytorch-image-models/tree/master/timm/models/vision_transformer.py
 
 import logging
+from typing import List, Sequence
 
+import torch
+import torch.nn.functional as F
 from torch import Tensor, nn
 
 logger = logging.getLogger("dinov2")
 
+# torch's fused attention (flash / memory-efficient kernels on GPU, flash
+# attention on CPU) never materializes the B x heads x N x N matrix
+SDPA_AVAILABLE = hasattr(F, "scaled_dot_product_attention")
+
 
 try:
     from xformers.ops import fmha, memory_efficient_attention, unbind
@@ -24,6 +31,71 @@ except ImportError:
     XFORMERS_AVAILABLE = False
 
 
+def _attend(q: Tensor, k: Tensor, v: Tensor, scale: float, fused: bool) -> Tensor:
+    """softmax(q @ k^T * scale) @ v for (B, heads, N, head_dim) inputs."""
+    if fused:
+        return F.scaled_dot_product_attention(q, k, v, scale=scale)
+    attn = (q * scale) @ k.transpose(-2, -1)
+    return attn.softmax(dim=-1) @ v
+
+
+class BlockDiagonalMask:
+    """
+    Portable stand-in for xFormers' `fmha.BlockDiagonalMask`.
+
+    Describes a packed (1, sum(seqlens), C) token sequence in which every
+    segment only attends to itself. `attend` runs each run of consecutive
+    equal-length segments as one batched attention call over a view of the
+    packed tensor, so no padding or dense N x N mask is ever built.
+    """
+
+    def __init__(self, seqlens: Sequence[int]):
+        self.seqlens = list(seqlens)
+        self._batch_sizes = None
+
+        # (start offset, segment count, segment length)
+        self.runs = []
+        offset = 0
+        for seqlen in self.seqlens:
+            if self.runs and self.runs[-1][2] == seqlen:
+                start, count, _ = self.runs[-1]
+                self.runs[-1] = (start, count + 1, seqlen)
+            else:
+                self.runs.append((offset, 1, seqlen))
+            offset += seqlen
+
+    @classmethod
+    def from_seqlens(cls, seqlens: Sequence[int]) -> "BlockDiagonalMask":
+        return cls(seqlens)
+
+    def attend(
+        self, q: Tensor, k: Tensor, v: Tensor, scale: float, fused: bool = True
+    ) -> Tensor:
+        """Packed (1, N, heads, head_dim) q, k, v -> (1, N, heads, head_dim) output."""
+        outputs = []
+        for start, count, seqlen in self.runs:
+            end = start + count * seqlen
+            q_run, k_run, v_run = (
+                t[0, start:end].reshape(count, seqlen, *t.shape[2:]).transpose(1, 2)
+                for t in (q, k, v)
+            )
+            out = _attend(q_run, k_run, v_run, scale, fused)
+            outputs.append(out.transpose(1, 2).reshape(1, count * seqlen, *q.shape[2:]))
+        return torch.cat(outputs, dim=1)
+
+    def split(self, x: Tensor) -> List[Tensor]:
+        """Packed (1, N, C) tensor -> one (batch size, seqlen, C) tensor per input."""
+        batch_sizes = self._batch_sizes or [1] * len(self.seqlens)
+
+        outputs, offset, segment = [], 0, 0
+        for batch_size in batch_sizes:
+            seqlen = self.seqlens[segment]
+            end = offset + batch_size * seqlen
+            outputs.append(x[:, offset:end].reshape(batch_size, seqlen, x.shape[-1]))
+            offset, segment = end, segment + batch_size
+        return outputs
+
+
 class Attention(nn.Module):
     def __init__(
         self,
@@ -44,6 +116,9 @@ class Attention(nn.Module):
         self.proj = nn.Linear(dim, dim, bias=proj_bias)
         self.proj_drop = nn.Dropout(proj_drop)
 
+        # False selects the explicit softmax(q @ k^T) path (parity testing)
+        self.fused_attn = SDPA_AVAILABLE
+
     def forward(self, x: Tensor) -> Tensor:
         B, N, C = x.shape
         qkv = (
@@ -52,13 +127,24 @@ class Attention(nn.Module):
             .permute(2, 0, 3, 1, 4)
         )
 
-        q, k, v = qkv[0] * self.scale, qkv[1], qkv[2]
-        attn = q @ k.transpose(-2, -1)
+        if self.fused_attn:
+            x = F.scaled_dot_product_attention(
+                qkv[0],
+                qkv[1],
+                qkv[2],
+                dropout_p=self.attn_drop.p if self.training else 0.0,
+                scale=self.scale,
+            )
+        else:
+            q, k, v = qkv[0] * self.scale, qkv[1], qkv[2]
+            attn = q @ k.transpose(-2, -1)
+
+            attn = attn.softmax(dim=-1)
+            attn = self.attn_drop(attn)
 
-        attn = attn.softmax(dim=-1)
-        attn = self.attn_drop(attn)
+            x = attn @ v
 
-        x = (attn @ v).transpose(1, 2).reshape(B, N, C)
+        x = x.transpose(1, 2).reshape(B, N, C)
         x = self.proj(x)
         x = self.proj_drop(x)
         return x
@@ -66,8 +152,20 @@ class Attention(nn.Module):
 
 class MemEffAttention(Attention):
     def forward(self, x: Tensor, attn_bias=None) -> Tensor:
+        if isinstance(attn_bias, BlockDiagonalMask):
+            B, N, C = x.shape
+            qkv = self.qkv(x).reshape(B, N, 3, self.num_heads, C // self.num_heads)
+            q, k, v = qkv.unbind(2)
+
+            x = attn_bias.attend(q, k, v, self.scale, self.fused_attn)
+            x = x.reshape([B, N, C])
+
+            x = self.proj(x)
+            x = self.proj_drop(x)
+            return x
+
         if not XFORMERS_AVAILABLE:
-            assert attn_bias is None, "xFormers is required for nested tensors usage"
+            assert attn_bias is None, "xFormers or a BlockDiagonalMask is required for nested tensors"
             return super().forward(x)
 
         B, N, C = x.shape
@@ -81,3 +179,11 @@ class MemEffAttention(Attention):
         x = self.proj(x)
         x = self.proj_drop(x)
         return x
+
+
+def set_fused_attention(model: nn.Module, enabled: bool = True) -> nn.Module:
+    """Switch every `Attention` in `model` between SDPA and the explicit path."""
+    for module in model.modules():
+        if isinstance(module, Attention):
+            module.fused_attn = enabled and SDPA_AVAILABLE
+    return model
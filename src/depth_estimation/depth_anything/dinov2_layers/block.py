@@ -9,12 +9,13 @@
 #   https://github.com/rwightman/pytorch-image-models/tree/master/timm/layers/patch_embed.py
 
 import logging
+import threading
 from typing import Any, Callable, Dict, List, Tuple
 
 import torch
 from torch import Tensor, nn
 
-from .attention import Attention, MemEffAttention
+from .attention import Attention, BlockDiagonalMask, MemEffAttention
 from .drop_path import DropPath
 from .layer_scale import LayerScale
 from .mlp import Mlp
@@ -162,6 +163,10 @@ def add_residual(x, brange, residual, residual_scale_factor, scaling_vector=None
 
 
 attn_bias_cache: Dict[Tuple, Any] = {}
+# Serving mixed-size batches creates many shape combinations; keep the newest
+ATTN_BIAS_CACHE_SIZE = 64
+# Depth worker threads share the cache
+attn_bias_cache_lock = threading.Lock()
 
 
 def get_attn_bias_and_cat(x_list, branges=None):
@@ -174,14 +179,22 @@ def get_attn_bias_and_cat(x_list, branges=None):
         else [x.shape[0] for x in x_list]
     )
     all_shapes = tuple((b, x.shape[1]) for b, x in zip(batch_sizes, x_list))
-    if all_shapes not in attn_bias_cache.keys():
-        seqlens = []
-        for b, x in zip(batch_sizes, x_list):
-            for _ in range(b):
-                seqlens.append(x.shape[1])
-        attn_bias = fmha.BlockDiagonalMask.from_seqlens(seqlens)
-        attn_bias._batch_sizes = batch_sizes
-        attn_bias_cache[all_shapes] = attn_bias
+    with attn_bias_cache_lock:
+        attn_bias = attn_bias_cache.get(all_shapes)
+        if attn_bias is None:
+            seqlens = []
+            for b, x in zip(batch_sizes, x_list):
+                for _ in range(b):
+                    seqlens.append(x.shape[1])
+            # Without xFormers, a portable mask that runs the blocks through SDPA
+            mask_class = (
+                fmha.BlockDiagonalMask if XFORMERS_AVAILABLE else BlockDiagonalMask
+            )
+            attn_bias = mask_class.from_seqlens(seqlens)
+            attn_bias._batch_sizes = batch_sizes
+            if len(attn_bias_cache) >= ATTN_BIAS_CACHE_SIZE:
+                del attn_bias_cache[next(iter(attn_bias_cache))]
+            attn_bias_cache[all_shapes] = attn_bias
 
     if branges is not None:
         cat_tensors = index_select_cat([x.flatten(1) for x in x_list], branges).view(
@@ -191,7 +204,7 @@ def get_attn_bias_and_cat(x_list, branges=None):
         tensors_bs1 = tuple(x.reshape([1, -1, *x.shape[2:]]) for x in x_list)
         cat_tensors = torch.cat(tensors_bs1, dim=1)
 
-    return attn_bias_cache[all_shapes], cat_tensors
+    return attn_bias, cat_tensors
 
 
 def drop_add_residual_stochastic_depth_list(
@@ -274,9 +287,10 @@ class NestedTensorBlock(Block):
         if isinstance(x_or_x_list, Tensor):
             return super().forward(x_or_x_list)
         elif isinstance(x_or_x_list, list):
-            assert (
-                XFORMERS_AVAILABLE
-            ), "Please install xFormers for nested tensors usage"
+            # Stochastic depth over nested tensors needs xFormers' fused kernels
+            assert XFORMERS_AVAILABLE or not (
+                self.training and self.sample_drop_ratio > 0.0
+            ), "Please install xFormers for nested tensors training"
             return self.forward_nested(x_or_x_list)
         else:
             raise AssertionError
@@ -1,13 +1,12 @@
-import cv2
-import numpy as np
+import math
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torchvision.transforms import Compose
 
 from .dinov2 import DINOv2
+from .preprocess import ImagePreprocessor
 from .util.blocks import FeatureFusionBlock, _make_scratch
-from .util.transform import NormalizeImage, PrepareForNet, Resize
 
 
 def _make_fusion_block(features, use_bn, size=None):
@@ -148,7 +147,8 @@ class DPTHead(nn.Module):
         out = self.scratch.output_conv1(path_1)
         out = F.interpolate(
             out,
-            (int(patch_h * 14), int(patch_w * 14)),
+            # No int(): keeps the size symbolic in ONNX exports
+            (patch_h * 14, patch_w * 14),
             mode="bilinear",
             align_corners=True,
         )
@@ -157,6 +157,96 @@ class DPTHead(nn.Module):
         return out
 
 
+def _bucket_shapes(shapes, max_pad_ratio):
+    """
+    Map bucket shape -> indices of `shapes` that run in that bucket.
+    Largest shapes open buckets first; smaller ones join a bucket that covers
+    them if the padded area stays within `max_pad_ratio` of the bucket.
+    """
+    buckets = {}
+    order = sorted(
+        range(len(shapes)), key=lambda i: shapes[i][0] * shapes[i][1], reverse=True
+    )
+
+    for i in order:
+        h, w = shapes[i]
+        for bh, bw in buckets:
+            if h <= bh and w <= bw and 1 - (h * w) / (bh * bw) <= max_pad_ratio:
+                buckets[(bh, bw)].append(i)
+                break
+        else:
+            buckets.setdefault((h, w), []).append(i)
+
+    return {shape: sorted(indices) for shape, indices in buckets.items()}
+
+
+def _pack_jobs(jobs, batch_size):
+    """Group (indices, shape) jobs into ragged passes of at most `batch_size` images."""
+    if not batch_size:
+        return [jobs] if jobs else []
+
+    packed, current, count = [], [], 0
+    for job in jobs:
+        if current and count + len(job[0]) > batch_size:
+            packed.append(current)
+            current, count = [], 0
+        current.append(job)
+        count += len(job[0])
+    if current:
+        packed.append(current)
+    return packed
+
+
+def _tile_starts(length, tile, stride):
+    """Start offsets of tiles covering [0, length), the last one flush with the end."""
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - tile) / stride) + 1
+    return [min(i * stride, length - tile) for i in range(count)]
+
+
+def _tile_grid(height, width, tile_size, overlap, max_tiles):
+    """
+    Square tile edge (in image pixels) and tile origins for a tiled pass.
+    Tiles start at `tile_size` image pixels (no downscaling, the most detail)
+    and grow until at most `max_tiles` of them cover the image.
+    """
+    tile = tile_size
+    while True:
+        stride = max(1, int(tile * (1 - overlap)))
+        ys = _tile_starts(height, tile, stride)
+        xs = _tile_starts(width, tile, stride)
+        if len(ys) * len(xs) <= max_tiles:
+            return min(tile, height), min(tile, width), ys, xs
+        tile = max(tile + 1, int(tile * 1.25))
+
+
+def _feather(length, ramp, device):
+    """1D blending weights: rise linearly over `ramp` pixels from each edge."""
+    position = torch.arange(length, device=device, dtype=torch.float32)
+    distance = torch.minimum(position + 1, length - position)
+    return (distance / max(ramp, 1)).clamp(1e-3, 1.0)
+
+
+def _align(depth, reference):
+    """Least-squares scale and shift mapping `depth` onto `reference`."""
+    depth, reference = depth.flatten().double(), reference.flatten().double()
+    depth_mean, reference_mean = depth.mean(), reference.mean()
+    variance = ((depth - depth_mean) ** 2).mean()
+    if variance < 1e-12:
+        return 1.0, float(reference_mean - depth_mean)
+    scale = ((depth - depth_mean) * (reference - reference_mean)).mean() / variance
+    scale = max(float(scale), 1e-6)
+    return scale, float(reference_mean - scale * depth_mean)
+
+
+def _pad_to(image, height, width):
+    pad_h, pad_w = height - image.shape[-2], width - image.shape[-1]
+    if pad_h == 0 and pad_w == 0:
+        return image
+    return F.pad(image, (0, pad_w, 0, pad_h), mode="replicate")
+
+
 class DepthAnything(nn.Module):
     def __init__(
         self,
@@ -186,8 +276,22 @@ class DepthAnything(nn.Module):
             use_clstoken=use_clstoken,
         )
 
+        self._preprocessors = {}
+        # Optional stand-in for `forward` at inference: compiled graphs or an
+        # ONNX Runtime session, see `InferenceBackend`
+        self.runner = None
+        # Device inputs are prepared on when it is not where the weights live
+        # (a weightless meta-device model in front of an ONNX runner)
+        self.input_device = None
+
+    @property
+    def dtype(self):
+        """Dtype of the weights (and of the inputs `forward` feeds them)."""
+        return self.pretrained.cls_token.dtype
+
     def forward(self, x):
         patch_h, patch_w = x.shape[-2] // 14, x.shape[-1] // 14
+        x = x.to(self.dtype)
 
         features = self.pretrained.get_intermediate_layers(
             x, self.intermediate_layer_idx[self.encoder], return_class_token=True
@@ -196,13 +300,38 @@ class DepthAnything(nn.Module):
         depth = self.depth_head(features, patch_h, patch_w)
         depth = F.relu(depth)
 
-        return depth.squeeze(1)
+        # Resizing and normalization downstream always run in fp32
+        return depth.squeeze(1).float()
+
+    def forward_ragged(self, x_list):
+        """
+        `forward` for a list of (B_i, 3, H_i, W_i) batches of different
+        resolutions. The ViT runs all of them as one packed token sequence
+        (block-diagonal attention, no padding); the DPT head, whose convolutions
+        need a fixed grid, runs once per batch. Returns one depth batch per input.
+        """
+        x_list = [x.to(self.dtype) for x in x_list]
+
+        features = self.pretrained.get_intermediate_layers_list(
+            x_list, self.intermediate_layer_idx[self.encoder], return_class_token=True
+        )
+
+        depths = []
+        for x, feature in zip(x_list, features):
+            depth = self.depth_head(feature, x.shape[-2] // 14, x.shape[-1] // 14)
+            depths.append(F.relu(depth).squeeze(1).float())
+        return depths
+
+    def _run(self, x):
+        if self.runner is not None:
+            return self.runner(x)
+        return self.forward(x)
 
     @torch.no_grad()
-    def infer_image(self, raw_image, input_size=518):
-        image, (h, w) = self.image2tensor(raw_image, input_size)
+    def infer_image(self, raw_image, input_size=518, preprocessing="default"):
+        image, (h, w) = self.image2tensor(raw_image, input_size, preprocessing)
 
-        depth = self.forward(image)
+        depth = self._run(image)
 
         depth = F.interpolate(
             depth[:, None], (h, w), mode="bilinear", align_corners=True
@@ -210,151 +339,173 @@ class DepthAnything(nn.Module):
 
         return depth.cpu().numpy()
 
-    def image2tensor(self, raw_image, input_size=518):
-        transform = Compose(
-            [
-                Resize(
-                    width=input_size,
-                    height=input_size,
-                    resize_target=False,
-                    keep_aspect_ratio=True,
-                    ensure_multiple_of=14,
-                    resize_method="lower_bound",
-                    image_interpolation_method=cv2.INTER_CUBIC,
-                ),
-                NormalizeImage(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-                PrepareForNet(),
-            ]
-        )
+    @torch.no_grad()
+    def infer_images(
+        self,
+        raw_images,
+        input_size=518,
+        max_pad_ratio=0.0,
+        batch_size=None,
+        preprocessing="default",
+        return_tensors=False,
+        output_sizes=None,
+        ragged=False,
+    ):
+        """
+        Batched version of `infer_image`, one depth map per image, in order.
+
+        Images run in one forward pass per input shape; a smaller image is
+        edge-padded into a larger shape's pass when that adds at most
+        `max_pad_ratio` of its area. With `ragged`, different shapes share one
+        `forward_ragged` pass instead.
+        """
+        preprocessor = self.get_preprocessor(input_size, preprocessing)
+
+        if output_sizes is None:
+            output_sizes = [raw_image.shape[:2] for raw_image in raw_images]
+
+        sizes = [tuple(size) for size in output_sizes]
+        shapes = [preprocessor.target_size(*image.shape[:2]) for image in raw_images]
+        results = [None] * len(raw_images)
+
+        # (image indices, bucket shape) of every forward-pass batch
+        jobs = []
+        for bucket_shape, indices in _bucket_shapes(shapes, max_pad_ratio).items():
+            chunk = batch_size or len(indices)
+            for start in range(0, len(indices), chunk):
+                jobs.append((indices[start : start + chunk], bucket_shape))
+
+        def make_batch(chunk_indices, bucket_shape):
+            # Preprocess straight into the (pinned, on CUDA) batch tensor
+            bh, bw = bucket_shape
+            batch = preprocessor.new_batch(len(chunk_indices), bh, bw)
+            for j, i in enumerate(chunk_indices):
+                if shapes[i] == bucket_shape:
+                    preprocessor.preprocess_into(raw_images[i], batch[j])
+                else:
+                    image = torch.empty((1, 3, *shapes[i]))
+                    preprocessor.preprocess_into(raw_images[i], image[0])
+                    batch[j] = _pad_to(image, bh, bw)[0]
+            return batch.to(preprocessor.device)
+
+        def collect(chunk_indices, depths):
+            # Crop the padding away and resize maps of equal geometry together
+            groups = {}
+            for j, i in enumerate(chunk_indices):
+                groups.setdefault((shapes[i], sizes[i]), []).append((j, i))
+
+            for ((h, w), size), members in groups.items():
+                cropped = depths[[j for j, _ in members], :h, :w]
+                resized = F.interpolate(
+                    cropped[:, None], size, mode="bilinear", align_corners=True
+                )[:, 0]
+                if not return_tensors:
+                    resized = resized.cpu().numpy()
+                for k, (_, i) in enumerate(members):
+                    results[i] = resized[k]
+
+        if not ragged:
+            for chunk_indices, bucket_shape in jobs:
+                collect(chunk_indices, self._run(make_batch(chunk_indices, bucket_shape)))
+            return results
+
+        for packed in _pack_jobs(jobs, batch_size):
+            batches = [make_batch(*job) for job in packed]
+            for (chunk_indices, _), depths in zip(packed, self.forward_ragged(batches)):
+                collect(chunk_indices, depths)
+
+        return results
 
+    @torch.no_grad()
+    def infer_tiled(
+        self,
+        raw_image,
+        input_size=518,
+        tile_size=518,
+        overlap=0.25,
+        max_tiles=16,
+        tile_batch_size=None,
+        preprocessing="default",
+        return_tensors=False,
+        output_size=None,
+    ):
+        """
+        Depth for a large image from overlapping tiles.
+
+        A global pass at `input_size` gives the coarse structure. The image is
+        then cut into square tiles overlapping by `overlap`. Tiles are
+        `tile_size` image pixels wide, or wider when more than `max_tiles`
+        would be needed. Each tile runs at `tile_size`, in forward passes of
+        `tile_batch_size` tiles (all at once by default).
+
+        Tile depths are relative, so each one is fitted onto the global map by
+        least-squares scale and shift before the overlaps are feather-blended.
+        Network memory is bounded by the tile count and tile size, whatever
+        the image size. Images that fit in one tile just get the global pass.
+        """
+        height, width = raw_image.shape[:2]
+        output_size = tuple(output_size or (height, width))
+
+        reference = self.infer_images(
+            [raw_image], input_size, preprocessing=preprocessing, return_tensors=True
+        )[0]
+
+        tile_h, tile_w, ys, xs = _tile_grid(height, width, tile_size, overlap, max_tiles)
+        if len(ys) * len(xs) > 1:
+            origins = [(y, x) for y in ys for x in xs]
+            chunk = tile_batch_size or len(origins)
+
+            ramp = int(min(tile_h, tile_w) * overlap)
+            weight = _feather(tile_h, ramp, reference.device)[:, None] * _feather(
+                tile_w, ramp, reference.device
+            )[None, :]
+            blended = torch.zeros_like(reference)
+            total = torch.zeros_like(reference)
+
+            for start in range(0, len(origins), chunk):
+                batch = origins[start : start + chunk]
+                tiles = [raw_image[y : y + tile_h, x : x + tile_w] for y, x in batch]
+                depths = self.infer_images(
+                    tiles, tile_size, preprocessing=preprocessing, return_tensors=True
+                )
+                for (y, x), depth in zip(batch, depths):
+                    region = (slice(y, y + tile_h), slice(x, x + tile_w))
+                    scale, shift = _align(depth, reference[region])
+                    blended[region] += weight * (depth * scale + shift)
+                    total[region] += weight
+
+            reference = blended / total
+
+        if output_size != (height, width):
+            reference = F.interpolate(
+                reference[None, None], output_size, mode="bilinear", align_corners=True
+            )[0, 0]
+
+        return reference if return_tensors else reference.cpu().numpy()
+
+    def warm_pos_embed_cache(self, image_shapes, input_size=518, preprocessing="default"):
+        """Interpolate the positional embeddings for (height, width) images ahead of time."""
+        preprocessor = self.get_preprocessor(input_size, preprocessing)
+        for h, w in image_shapes:
+            th, tw = preprocessor.target_size(h, w)
+            self.pretrained.cached_pos_embed(
+                th // 14, tw // 14, self.dtype, self.pretrained.cls_token.device
+            )
+
+    def input_shape(self, raw_image, input_size=518):
+        """Network input (height, width) the image is resized to."""
         h, w = raw_image.shape[:2]
-
-        image = cv2.cvtColor(raw_image, cv2.COLOR_BGR2RGB) / 255.0
-
-        image = transform({"image": image})["image"]
-        image = torch.from_numpy(image).unsqueeze(0)
-
-        DEVICE = (
-            "cuda"
-            if torch.cuda.is_available()
-            else "mps" if torch.backends.mps.is_available() else "cpu"
-        )
-        image = image.to(DEVICE)
-
-        return image, (h, w)
-
-
-# class DepthAnything(nn.Module):
-#     def __init__(
-#         self,
-#         encoder="vitl",
-#         features=256,
-#         out_channels=[256, 512, 1024, 1024],
-#         use_bn=False,
-#         use_clstoken=False,
-#     ):
-#         super(DepthAnything, self).__init__()
-
-#         self.intermediate_layer_idx = {
-#             "vits": [2, 5, 8, 11],
-#             "vitb": [2, 5, 8, 11],
-#             "vitl": [4, 11, 17, 23],
-#             "vitg": [9, 19, 29, 39],
-#         }
-
-#         self.encoder = encoder
-#         self.pretrained = DINOv2(model_name=encoder)
-
-#         self.depth_head = DPTHead(
-#             self.pretrained.embed_dim,
-#             features,
-#             use_bn,
-#             out_channels=out_channels,
-#             use_clstoken=use_clstoken,
-#         )
-
-#     def forward(self, x):
-#         patch_h, patch_w = x.shape[-2] // 14, x.shape[-1] // 14
-
-#         features = self.pretrained.get_intermediate_layers(
-#             x, self.intermediate_layer_idx[self.encoder], return_class_token=True
-#         )
-
-#         depth = self.depth_head(features, patch_h, patch_w)
-#         depth = F.relu(depth)
-
-#         return depth.squeeze(1)
-
-#     @torch.no_grad()
-#     def infer_image(self, raw_image, input_size=518):
-#         image, (h, w) = self.image2tensor(raw_image, input_size)
-
-#         depth = self.forward(image)
-
-#         depth = F.interpolate(
-#             depth[:, None], (h, w), mode="bilinear", align_corners=True
-#         )[0, 0]
-
-#         return depth.cpu().numpy()
-    
-#     @torch.no_grad()
-#     def infer_images(self, raw_images, input_size=518):
-#         """
-#         raw_images: List of raw images (numpy arrays)
-#         """
-        
-#         # Set model to evaluation mode
-#         self.eval()
-
-#         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-#         self.to(device)
-
-#         # Preprocess all images and record original sizes
-#         processed_images = []
-#         original_sizes = []
-
-#         transform = Compose(
-#             [
-#                 Resize(
-#                     width=input_size,
-#                     height=input_size,
-#                     resize_target=False,
-#                     keep_aspect_ratio=True,
-#                     ensure_multiple_of=14,
-#                     resize_method="lower_bound",
-#                     image_interpolation_method=cv2.INTER_CUBIC,
-#                 ),
-#                 NormalizeImage(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-#                 PrepareForNet(),
-#             ]
-#         )
-
-#         for img in raw_images:
-#             h, w = img.shape[:2]
-#             original_sizes.append((h, w))
-
-#             image = cv2.cvtColor(img, cv2.COLOR_BGR2RGB) / 255.0
-#             image = transform({"image": image})["image"]
-#             image = torch.from_numpy(image).float()
-#             processed_images.append(image)
-
-#         print([image.shape for image in processed_images])
-#         # Stack images into a batch tensor
-#         batch_tensor = torch.stack(processed_images).to(device)  # Shape: [batch_size, 3, H, W]
-
-#         # Forward pass
-#         depth_maps = self.forward(batch_tensor)  # Shape: [batch_size, H, W]
-
-#         # Post-process depth maps
-#         depth_maps_resized = []
-#         for i in range(depth_maps.shape[0]):
-#             depth_map = depth_maps[i].unsqueeze(0).unsqueeze(0)  # Shape: [1, 1, H, W]
-#             depth_map_resized = F.interpolate(
-#                 depth_map,
-#                 size=original_sizes[i],
-#                 mode="bilinear",
-#                 align_corners=True,
-#             ).squeeze(0).squeeze(0)
-#             depth_maps_resized.append(depth_map_resized.cpu().numpy())
-
-#         return depth_maps_resized
\ No newline at end of file
+        return self.get_preprocessor(input_size).target_size(h, w)
+
+    def get_preprocessor(self, input_size=518, mode="default"):
+        """Cached `ImagePreprocessor` targeting the device the model lives on."""
+        device = self.input_device or self.pretrained.cls_token.device
+        key = (input_size, mode, device)
+        if key not in self._preprocessors:
+            self._preprocessors[key] = ImagePreprocessor(
+                input_size, device=device, mode=mode
+            )
+        return self._preprocessors[key]
+
+    def image2tensor(self, raw_image, input_size=518, preprocessing="default"):
+        return self.get_preprocessor(input_size, preprocessing)(raw_image)
@@ -0,0 +1,202 @@
+import threading
+
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torchvision.transforms import Compose
+
+from .util.transform import NormalizeImage, PrepareForNet, Resize
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+PREPROCESSING_MODES = ("default", "fused", "torch")
+
+
+class ImagePreprocessor:
+    """
+    Turns raw BGR uint8 images into network input tensors.
+
+    Built once per model and input size: the transform pipeline, the target
+    device and the mean/std arrays are created here, so each call only does
+    the per-pixel work.
+
+    Modes:
+        "default": the original float64 Resize -> NormalizeImage ->
+            PrepareForNet pipeline.
+        "fused": resizes the uint8 frame, then scales, normalizes, swaps
+            BGR -> RGB and transposes HWC -> CHW in a single float32 pass
+            into the output buffer. Staging buffers are pooled per thread.
+            Differs from "default" only by uint8 rounding of the resize (see
+            `compare_to_reference`).
+        "torch": uploads the uint8 frame to the model device once and does
+            the color swap, bicubic resize and normalization there as torch
+            ops, so large photos are resized by the same hardware that runs
+            the model (torch's vectorized uint8 kernels on CPU).
+    """
+
+    def __init__(
+        self,
+        input_size=518,
+        device="cpu",
+        mean=IMAGENET_MEAN,
+        std=IMAGENET_STD,
+        mode="default",
+    ):
+        if mode not in PREPROCESSING_MODES:
+            raise ValueError(
+                f"Unknown preprocessing mode {mode!r}, expected one of {PREPROCESSING_MODES}."
+            )
+
+        self.input_size = input_size
+        self.device = torch.device(device)
+        self.mode = mode
+
+        # Pre-shaped for broadcasting over HWC images
+        self.mean = np.asarray(mean, dtype=np.float64).reshape(1, 1, 3)
+        self.std = np.asarray(std, dtype=np.float64).reshape(1, 1, 3)
+
+        # (x / 255 - mean) / std == x * scale - offset, per RGB channel
+        self.scale = (1.0 / (255.0 * self.std)).astype(np.float32).ravel()
+        self.offset = (self.mean / self.std).astype(np.float32).ravel()
+
+        self.resize = Resize(
+            width=input_size,
+            height=input_size,
+            resize_target=False,
+            keep_aspect_ratio=True,
+            ensure_multiple_of=14,
+            resize_method="lower_bound",
+            image_interpolation_method=cv2.INTER_CUBIC,
+        )
+        self.transform = Compose(
+            [
+                self.resize,
+                NormalizeImage(mean=self.mean, std=self.std),
+                PrepareForNet(),
+            ]
+        )
+
+        self._pool = threading.local()
+
+        if mode == "torch":
+            self.scale_tensor = torch.from_numpy(self.scale).view(1, 3, 1, 1)
+            self.scale_tensor = self.scale_tensor.to(self.device)
+            self.offset_tensor = torch.from_numpy(self.offset).view(1, 3, 1, 1)
+            self.offset_tensor = self.offset_tensor.to(self.device)
+
+    def target_size(self, height, width):
+        """Network input (height, width) for an image of the given size."""
+        new_width, new_height = self.resize.get_size(width, height)
+        return int(new_height), int(new_width)
+
+    def new_batch(self, batch_size, height, width):
+        """
+        Tensor to fill with `preprocess_into`: on the model device for the
+        "torch" mode, otherwise on the host (pinned when the model is on CUDA).
+        """
+        if self.mode == "torch":
+            return torch.empty(
+                (batch_size, 3, height, width), dtype=torch.float32, device=self.device
+            )
+        return torch.empty(
+            (batch_size, 3, height, width),
+            dtype=torch.float32,
+            pin_memory=self.device.type == "cuda",
+        )
+
+    def preprocess_into(self, raw_image, out):
+        """Write the network input for `raw_image` into the (3, H, W) float32 tensor `out`."""
+        if self.mode == "torch":
+            out.copy_(self._torch_preprocess(raw_image, *out.shape[-2:])[0])
+            return out
+
+        if self.mode == "default":
+            image = cv2.cvtColor(raw_image, cv2.COLOR_BGR2RGB) / 255.0
+            image = self.transform({"image": image})["image"]
+            out.copy_(torch.from_numpy(image))
+            return out
+
+        height, width = out.shape[-2:]
+        resized = cv2.resize(
+            raw_image,
+            (width, height),
+            dst=self._buffer("resized", (height, width, 3), np.uint8),
+            interpolation=cv2.INTER_CUBIC,
+        )
+
+        chw = out.numpy()
+        for c in range(3):
+            # Output channel c (RGB) comes from input channel 2 - c (BGR)
+            np.multiply(
+                resized[..., 2 - c], self.scale[c], out=chw[c], dtype=np.float32
+            )
+            chw[c] -= self.offset[c]
+
+        return out
+
+    def __call__(self, raw_image):
+        h, w = raw_image.shape[:2]
+        height, width = self.target_size(h, w)
+
+        if self.mode == "torch":
+            return self._torch_preprocess(raw_image, height, width), (h, w)
+
+        if self.mode == "fused" and self.device.type != "cpu":
+            # Stage in a pooled buffer; the device copy owns the result
+            staging = self._buffer("staging", (1, 3, height, width), torch.float32)
+            self.preprocess_into(raw_image, staging[0])
+            return staging.to(self.device), (h, w)
+
+        image = torch.empty((1, 3, height, width), dtype=torch.float32)
+        self.preprocess_into(raw_image, image[0])
+
+        return image.to(self.device), (h, w)
+
+    def _torch_preprocess(self, raw_image, height, width):
+        image = torch.from_numpy(raw_image).to(self.device)
+
+        # HWC -> 1xCxHxW as a (channels-last) view over the uploaded frame
+        image = image.permute(2, 0, 1).unsqueeze(0)
+
+        if self.device.type == "cpu":
+            # Resize on uint8 first so only the small frame is converted to float
+            image = F.interpolate(
+                image, (height, width), mode="bicubic", align_corners=False
+            ).float()
+        else:
+            image = F.interpolate(
+                image.float(), (height, width), mode="bicubic", align_corners=False
+            )
+
+        # BGR -> RGB on the resized frame
+        image = image.flip(1)
+
+        return (image * self.scale_tensor - self.offset_tensor).contiguous()
+
+    def compare_to_reference(self, raw_image):
+        """Absolute error of this preprocessor against the "default" pipeline."""
+        reference = ImagePreprocessor(
+            self.input_size, mean=self.mean.ravel(), std=self.std.ravel()
+        )
+        expected, _ = reference(raw_image)
+        actual, _ = self(raw_image)
+        error = (actual.cpu() - expected).abs()
+        return {"max": error.max().item(), "mean": error.mean().item()}
+
+    def _buffer(self, name, shape, dtype):
+        # One flat buffer per name and thread, grown to the largest frame so
+        # far; every call gets a contiguous view of the size it needs
+        if not hasattr(self._pool, "buffers"):
+            self._pool.buffers = {}
+        buffers = self._pool.buffers
+        size = int(np.prod(shape))
+        if name not in buffers or buffers[name].shape[0] < size:
+            if dtype is torch.float32:
+                buffers[name] = torch.empty(
+                    size, dtype=dtype, pin_memory=self.device.type == "cuda"
+                )
+            else:
+                buffers[name] = np.empty(size, dtype=dtype)
+        return buffers[name][:size].reshape(shape)
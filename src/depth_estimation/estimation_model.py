@@ -1,12 +1,124 @@
+import abc
 import re
 from pathlib import Path
-from typing import List
+from typing import List, Optional, Tuple
 
-import cv2
 import numpy as np
 import torch
 
+from .compilation import CompiledForward
+from .depth_anything.dinov2_layers import set_fused_attention
 from .depth_anything.dpt import DepthAnything
+from .postprocess import DepthPostprocessor
+from .precision import set_precision
+from .quantization import quantize_model
+from .weights import load_state_dict
+
+MODEL_CONFIGS = {
+    "vits": {
+        "encoder": "vits",
+        "features": 64,
+        "out_channels": [48, 96, 192, 384],
+    },
+    "vitb": {
+        "encoder": "vitb",
+        "features": 128,
+        "out_channels": [96, 192, 384, 768],
+    },
+    "vitl": {
+        "encoder": "vitl",
+        "features": 256,
+        "out_channels": [256, 512, 1024, 1024],
+    },
+}
+
+BACKENDS = ("torch", "onnx")
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+class InferenceBackend(abc.ABC):
+    """
+    Runs the network: a (B, 3, H, W) normalized image batch on the model
+    device in, a (B, H, W) fp32 relative depth batch on the same device out.
+    Pre- and post-processing stay in `DepthAnything.infer_images`.
+    """
+
+    name = None
+
+    @abc.abstractmethod
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        ...
+
+    @property
+    @abc.abstractmethod
+    def memory_bytes(self) -> int:
+        """Bytes held by the network's weights."""
+
+
+class TorchBackend(InferenceBackend):
+    """The torch module itself, or its shape-specialized graphs when compiled."""
+
+    name = "torch"
+
+    def __init__(self, model: DepthAnything, compiled: Optional[CompiledForward] = None):
+        self.model = model
+        self.compiled = compiled
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        if self.compiled is not None:
+            return self.compiled(x)
+        return self.model(x)
+
+    @property
+    def memory_bytes(self) -> int:
+        # Including packed int8 weights, which the state dict holds as tuples
+        return sum(_nbytes(v) for v in self.model.state_dict().values())
+
+
+class OnnxBackend(InferenceBackend):
+    """An ONNX Runtime session over a model exported by `onnx_export`."""
+
+    name = "onnx"
+
+    def __init__(self, onnx_path: str | Path, device: torch.device):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError(
+                "The ONNX backend needs onnxruntime: pip install onnxruntime"
+            ) from None
+
+        providers = ["CPUExecutionProvider"]
+        if (
+            device.type == "cuda"
+            and "CUDAExecutionProvider" in ort.get_available_providers()
+        ):
+            providers.insert(0, "CUDAExecutionProvider")
+
+        self.onnx_path = Path(onnx_path)
+        self.session = ort.InferenceSession(str(self.onnx_path), providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        image = x.detach().float().cpu().numpy()
+        (depth,) = self.session.run(None, {self.input_name: image})
+        return torch.from_numpy(depth).to(x.device)
+
+    @property
+    def memory_bytes(self) -> int:
+        # The graph and its initializers, inline or in an external "<name>.onnx.data"
+        return sum(
+            path.stat().st_size
+            for path in self.onnx_path.parent.glob(f"{self.onnx_path.name}*")
+            if path.is_file()
+        )
 
 
 class DepthModel:
@@ -16,6 +128,21 @@ class DepthModel:
         device: str | torch.device,
         model_load_dir: str | Path,
         grayscale: bool = False,
+        max_pad_ratio: float = 0.0,
+        ragged: bool = False,
+        preprocessing: str = "default",
+        colormap: str = "viridis",
+        fast_load: bool = True,
+        precision: str = "fp32",
+        fused_attention: bool = True,
+        quantization: str = "none",
+        quantize_head: bool = False,
+        calibration_images: Optional[List[np.ndarray]] = None,
+        warmup_shapes: Optional[List[Tuple[int, int]]] = None,
+        compile_mode: str = "none",
+        compile_batch_sizes: Tuple[int, ...] = (1,),
+        backend: str = "torch",
+        onnx_path: str | Path | None = None,
     ):
 
         if (
@@ -34,19 +161,90 @@ class DepthModel:
         self.device = device
 
         self.model_load_dir = Path(model_load_dir)
+        self.fast_load = fast_load
 
         self.version = self._get_version()
         self.encoder = self._get_encoder()
 
-        self.model = self._load_model()
-        self.model.eval()
-        self.model = self.model.to(device=self.device)
+        if precision != "fp32" and quantization != "none":
+            raise ValueError("Quantized models run in fp32; use one or the other.")
+
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}.")
+        if backend == "onnx" and (
+            precision != "fp32"
+            or quantization != "none"
+            or quantize_head
+            or compile_mode != "none"
+            or ragged
+        ):
+            raise ValueError(
+                "The ONNX backend runs the exported fp32 graph; precision, "
+                "quantization, compile and ragged batching are torch-only."
+            )
+
+        if backend == "onnx":
+            # Only pre- and post-processing run in torch: no weights needed
+            self.model = self._build_model()
+        else:
+            self.model = self._load_model()
+            self.model.eval()
+            self.model = self.model.to(device=self.device)
+
+        # torch SDPA attention; False restores the explicit softmax(q @ k^T)
+        set_fused_attention(self.model, fused_attention)
 
         self.total_params = (
             sum(p.numel() for p in self.model.parameters()) / 1e6
         )  # In millions
 
+        # Weights cast once here; LayerNorms stay fp32, see `set_precision`
+        self.precision = precision
+        self.model = set_precision(self.model, precision, self.device)
+
+        # Int8 CPU inference, see `quantize_model`
+        self.quantization = quantization
+        self.model = quantize_model(
+            self.model,
+            quantization,
+            quantize_head=quantize_head,
+            calibration_images=calibration_images or [],
+        )
+
         self.grayscale = grayscale
+        self.max_pad_ratio = max_pad_ratio
+        # Mixed input shapes share one packed ViT pass, see `forward_ragged`
+        self.ragged = ragged
+        self.preprocessing = preprocessing
+
+        self.postprocessor = DepthPostprocessor("gray" if grayscale else colormap)
+
+        # Positional embeddings for the usual image sizes, interpolated once
+        if backend == "torch":
+            self.model.warm_pos_embed_cache(
+                warmup_shapes or [], preprocessing=preprocessing
+            )
+
+        # Shape-specialized graphs for the network inputs of `warmup_shapes`
+        # at each of `compile_batch_sizes`; other shapes run eagerly
+        self.compile_mode = compile_mode
+        compiled = None
+        if compile_mode != "none":
+            input_shapes = dict.fromkeys(
+                self.model.get_preprocessor(mode=preprocessing).target_size(h, w)
+                for h, w in warmup_shapes or []
+            )
+            compiled = CompiledForward(self.model, compile_mode).warm_up(
+                (batch, h, w) for batch in compile_batch_sizes for h, w in input_shapes
+            )
+
+        # The network itself runs on `backend`; the torch model still does
+        # the pre- and post-processing (and, for ONNX, holds no weights)
+        if backend == "onnx":
+            self.backend = OnnxBackend(onnx_path or self.onnx_path, self.device)
+        else:
+            self.backend = TorchBackend(self.model, compiled)
+        self.model.runner = self.backend
 
     def _get_version(self):
         match = re.search(r"v(1|2)", self.model_name.lower())
@@ -64,36 +262,75 @@ class DepthModel:
         )
 
     def _load_model(self):
-
-        model_configs = {
-            "vits": {
-                "encoder": "vits",
-                "features": 64,
-                "out_channels": [48, 96, 192, 384],
-            },
-            "vitb": {
-                "encoder": "vitb",
-                "features": 128,
-                "out_channels": [96, 192, 384, 768],
-            },
-            "vitl": {
-                "encoder": "vitl",
-                "features": 256,
-                "out_channels": [256, 512, 1024, 1024],
-            },
-        }
-        model = DepthAnything(**model_configs[self.encoder])
         model_path = (
             self.model_load_dir / f"depth_anything_{self.version}_{self.encoder}.pth"
         )
-        model.load_state_dict(
-            torch.load(model_path, map_location="cpu", weights_only=True)
-        )
+
+        if not self.fast_load:
+            model = DepthAnything(**MODEL_CONFIGS[self.encoder])
+            model.load_state_dict(
+                torch.load(model_path, map_location="cpu", weights_only=True)
+            )
+            return model.to(self.device).eval()
+
+        # Build on the meta device (no memory, no random init) and adopt the
+        # memory-mapped checkpoint tensors as the parameters, without a copy
+        with torch.device("meta"):
+            model = DepthAnything(**MODEL_CONFIGS[self.encoder])
+        model.load_state_dict(load_state_dict(model_path), assign=True)
+
         return model.to(self.device).eval()
 
-    def infer(self, images: List[np.ndarray]) -> np.ndarray:
-        depth_maps = []
+    def _build_model(self):
+        """Weightless model on the meta device that prepares inputs on `self.device`."""
+        with torch.device("meta"):
+            model = DepthAnything(**MODEL_CONFIGS[self.encoder])
+        model.input_device = self.device
+        return model.eval()
+
+    @property
+    def onnx_path(self) -> Path:
+        """Default location of the exported model, next to the checkpoint."""
+        return self.model_load_dir / f"depth_anything_{self.version}_{self.encoder}.onnx"
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes held by the weights of the backend that runs the network."""
+        return self.backend.memory_bytes
+
+    def input_shape(self, image: np.ndarray, input_size: int = 518) -> tuple:
+        """Network input (height, width) used for `image`."""
+        return self.model.input_shape(image, input_size)
 
+    def infer(
+        self,
+        images: List[np.ndarray],
+        output_sizes: Optional[List[Tuple[int, int]]] = None,
+        input_size: int = 518,
+    ) -> np.ndarray | List[np.ndarray]:
+        """
+        Colorized depth maps (uint8, BGR like `cv2.applyColorMap`) for a list
+        of BGR images. Returns one (B, H, W, 3) array when all images share a
+        size, else a list of (H, W, 3) arrays.
+        """
+        depths = self.infer_depth(
+            images, return_tensors=True, output_sizes=output_sizes, input_size=input_size
+        )
+        return self.postprocessor(depths)
+
+    def infer_depth(
+        self,
+        images: List[np.ndarray],
+        return_tensors: bool = False,
+        output_sizes: Optional[List[Tuple[int, int]]] = None,
+        input_size: int = 518,
+    ) -> List[np.ndarray] | List[torch.Tensor]:
+        """
+        Raw relative depth (float) for a list of BGR images, as numpy arrays
+        or tensors left on the model device. Each map has the size of its
+        image, or the matching (height, width) in `output_sizes`. Images are
+        resized so their shorter side is `input_size` (see `resolution`).
+        """
         if type(images) != list:
             raise TypeError("Input must be a list of images.")
 
@@ -101,19 +338,47 @@ class DepthModel:
             if image.ndim != 3:
                 raise ValueError("Input image must have 3 channels.")
 
-            depth = self.model.infer_image(image)
-
-            depth_map_normalized = depth / np.max(depth)
-
-            depth_map_uint8 = (depth_map_normalized * 255).astype("uint8")
-            depth_map_uint8 = depth_map_uint8.squeeze()
-
-            if self.grayscale:
-                depth = np.repeat(depth_map_uint8[..., np.newaxis], 3, axis=-1)
-
-            else:
-                depth = cv2.applyColorMap(depth_map_uint8, cv2.COLORMAP_VIRIDIS)
+        return self.model.infer_images(
+            images,
+            input_size=input_size,
+            max_pad_ratio=self.max_pad_ratio,
+            ragged=self.ragged,
+            preprocessing=self.preprocessing,
+            return_tensors=return_tensors,
+            output_sizes=output_sizes,
+        )
 
-            depth_maps.append(depth)
+    def infer_depth_tiled(
+        self,
+        image: np.ndarray,
+        tile_size: int = 518,
+        overlap: float = 0.25,
+        max_tiles: int = 16,
+        tile_batch_size: Optional[int] = None,
+        return_tensors: bool = False,
+        output_size: Optional[Tuple[int, int]] = None,
+    ) -> np.ndarray | torch.Tensor:
+        """
+        Raw relative depth for one large (e.g. 4K) BGR image, with more detail
+        than a single 518 pass. Overlapping tiles are aligned to a global pass
+        and blended; see `DepthAnything.infer_tiled`.
+        """
+        if image.ndim != 3:
+            raise ValueError("Input image must have 3 channels.")
+        if not 0 <= overlap < 1:
+            raise ValueError("overlap must be in [0, 1).")
+        if tile_size < 1:
+            raise ValueError("tile_size must be positive.")
+        if max_tiles < 1:
+            raise ValueError("max_tiles must be at least 1.")
 
-        return depth_maps
+        return self.model.infer_tiled(
+            image,
+            tile_size=tile_size,
+            overlap=overlap,
+            max_tiles=max_tiles,
+            tile_batch_size=tile_batch_size,
+            preprocessing=self.preprocessing,
+            return_tensors=return_tensors,
+            output_size=output_size,
+        )
@@ -0,0 +1,14 @@
+from pathlib import Path
+from typing import List
+
+import cv2
+import numpy as np
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+
+
+def load_images(image_dir: str | Path, limit: int | None = None) -> List[np.ndarray]:
+    """BGR images (.jpg/.jpeg/.png) from a directory, in name order."""
+    paths = sorted(p for p in Path(image_dir).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    images = [cv2.imread(str(p)) for p in paths[:limit]]
+    return [image for image in images if image is not None]
@@ -0,0 +1,82 @@
+import argparse
+from pathlib import Path
+
+import torch
+
+from .depth_anything.dinov2_layers.attention import Attention
+from .depth_anything.dpt import DepthAnything
+from .estimation_model import DepthModel
+
+
+def export_onnx(
+    model: DepthAnything,
+    output_path: str | Path,
+    opset: int = 17,
+    example_shape: tuple = (518, 686),
+) -> Path:
+    """
+    Export an fp32 DepthAnything model to ONNX.
+
+    The graph takes a normalized (batch, 3, height, width) float32 image, with
+    height and width any multiples of 14, and returns (batch, height, width)
+    relative depth. `example_shape` only needs to be non-square, so the
+    positional-embedding interpolation is traced.
+    """
+    output_path = Path(output_path)
+    device = model.pretrained.cls_token.device
+    example = torch.zeros((1, 3, *example_shape), device=device)
+
+    # The explicit attention path exports with every opset
+    attentions = [m for m in model.modules() if isinstance(m, Attention)]
+    fused = [m.fused_attn for m in attentions]
+    for attention in attentions:
+        attention.fused_attn = False
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (example,),
+                str(output_path),
+                input_names=["image"],
+                output_names=["depth"],
+                dynamic_axes={
+                    "image": {0: "batch", 2: "height", 3: "width"},
+                    "depth": {0: "batch", 1: "height", 2: "width"},
+                },
+                opset_version=opset,
+                do_constant_folding=True,
+            )
+    finally:
+        for attention, enabled in zip(attentions, fused):
+            attention.fused_attn = enabled
+
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export Depth Anything models to ONNX (dynamic batch, height and width)."
+    )
+    parser.add_argument("models", nargs="+", help="e.g. v2_vits v2_vitb v2_vitl")
+    parser.add_argument("--weights-dir", type=Path, default=Path("tmp/model-weights"))
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=None,
+        help="Where to write the .onnx files (default: next to the weights)",
+    )
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    for name in args.models:
+        depth_model = DepthModel(name, "cpu", args.weights_dir)
+        output_path = depth_model.onnx_path
+        if args.output_dir:
+            output_path = args.output_dir / output_path.name
+
+        export_onnx(depth_model.model, output_path, opset=args.opset)
+        print(f"{name} -> {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+import torch
+
+COLORMAPS = {
+    "viridis": cv2.COLORMAP_VIRIDIS,
+    "inferno": cv2.COLORMAP_INFERNO,
+    "magma": cv2.COLORMAP_MAGMA,
+    "plasma": cv2.COLORMAP_PLASMA,
+    "turbo": cv2.COLORMAP_TURBO,
+    "jet": cv2.COLORMAP_JET,
+    "gray": None,
+}
+
+
+@lru_cache(maxsize=None)
+def colormap_lut(name: str, device: torch.device) -> torch.Tensor:
+    """(256, 3) uint8 lookup table in OpenCV's BGR channel order, cached per device."""
+    if name not in COLORMAPS:
+        raise ValueError(
+            f"Unknown colormap {name!r}, expected one of {list(COLORMAPS)}."
+        )
+
+    levels = np.arange(256, dtype=np.uint8)
+    if COLORMAPS[name] is None:
+        lut = np.repeat(levels[:, None], 3, axis=1)
+    else:
+        lut = cv2.applyColorMap(levels[:, None], COLORMAPS[name])[:, 0]
+
+    return torch.from_numpy(np.ascontiguousarray(lut)).to(device)
+
+
+class DepthPostprocessor:
+    """
+    Turns raw depth maps into uint8 color images on the device they live on.
+
+    Each map is min/max normalized, quantized to 256 levels and colored by a
+    gather from the colormap lookup table. Maps of equal size are processed
+    as one batch and only the final uint8 pixels are copied back to the host.
+    """
+
+    def __init__(self, colormap: str = "viridis"):
+        if colormap not in COLORMAPS:
+            raise ValueError(
+                f"Unknown colormap {colormap!r}, expected one of {list(COLORMAPS)}."
+            )
+        self.colormap = colormap
+
+    def quantize(
+        self, depths: torch.Tensor, ranges: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
+        """
+        (B, H, W) float depths -> (B, H, W) uint8 levels, normalized per map,
+        or to the (low, high) rows of a (B, 2) `ranges` when given.
+        """
+        depths = depths.float()
+        if ranges is None:
+            low = depths.amin(dim=(1, 2), keepdim=True)
+            high = depths.amax(dim=(1, 2), keepdim=True)
+        else:
+            ranges = ranges.to(depths.device, torch.float32)
+            low, high = ranges[:, 0, None, None], ranges[:, 1, None, None]
+        normalized = (depths - low) / (high - low).clamp_min(1e-6)
+        return (normalized.clamp(0, 1) * 255).to(torch.uint8)
+
+    def colorize(
+        self, depths: torch.Tensor, ranges: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
+        """(B, H, W) float depths -> (B, H, W, 3) uint8 colors, on the same device."""
+        lut = colormap_lut(self.colormap, depths.device)
+        return lut[self.quantize(depths, ranges).long()]
+
+    def __call__(self, depths: List[torch.Tensor]) -> np.ndarray | List[np.ndarray]:
+        """
+        Colorize a list of (H, W) depth maps. Returns one contiguous
+        (B, H, W, 3) array when all maps share a size, else a list of arrays.
+        """
+        groups = {}
+        for i, depth in enumerate(depths):
+            groups.setdefault(tuple(depth.shape), []).append(i)
+
+        if len(groups) == 1:
+            return self.colorize(torch.stack(depths)).cpu().numpy()
+
+        results = [None] * len(depths)
+        for indices in groups.values():
+            colored = self.colorize(torch.stack([depths[i] for i in indices]))
+            colored = colored.cpu().numpy()
+            for k, i in enumerate(indices):
+                results[i] = colored[k]
+
+        return results
+
+
+class RangeSmoother:
+    """
+    Normalization range for a sequence of video frames.
+
+    Normalizing every frame to its own min/max makes colors flicker as
+    objects enter and leave; instead each frame's (low, high) is an
+    exponential moving average of the per-frame ranges, with `momentum` the
+    weight of the history (0 disables smoothing).
+    """
+
+    def __init__(self, momentum: float = 0.8):
+        if not 0 <= momentum < 1:
+            raise ValueError("momentum must be in [0, 1).")
+        self.momentum = momentum
+        self.range: Optional[Tuple[float, float]] = None
+
+    def __call__(self, depths: torch.Tensor) -> torch.Tensor:
+        """(B, H, W) consecutive frames -> (B, 2) smoothed (low, high) per frame."""
+        lows = depths.amin(dim=(1, 2)).float().cpu().tolist()
+        highs = depths.amax(dim=(1, 2)).float().cpu().tolist()
+
+        ranges = []
+        for low, high in zip(lows, highs):
+            if self.range is not None:
+                m = self.momentum
+                low = m * self.range[0] + (1 - m) * low
+                high = m * self.range[1] + (1 - m) * high
+            self.range = (low, high)
+            ranges.append(self.range)
+        return torch.tensor(ranges)
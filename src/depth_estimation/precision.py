@@ -0,0 +1,77 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+PRECISIONS = {
+    "fp32": torch.float32,
+    "bf16": torch.bfloat16,
+    "fp16": torch.float16,
+}
+
+
+class FP32LayerNorm(nn.LayerNorm):
+    """LayerNorm that normalizes in fp32 and returns the input's dtype."""
+
+    def forward(self, x):
+        return F.layer_norm(
+            x.float(), self.normalized_shape, self.weight, self.bias, self.eps
+        ).to(x.dtype)
+
+
+def _to_fp32_layer_norm(norm: nn.LayerNorm) -> FP32LayerNorm:
+    replacement = FP32LayerNorm(
+        norm.normalized_shape,
+        eps=norm.eps,
+        elementwise_affine=norm.elementwise_affine,
+        device=norm.weight.device if norm.weight is not None else None,
+    )
+    if norm.elementwise_affine:
+        replacement.load_state_dict({k: v.float() for k, v in norm.state_dict().items()})
+    return replacement
+
+
+def set_precision(model: nn.Module, precision: str, device: torch.device) -> nn.Module:
+    """
+    Cast a model's weights once for `precision` inference, in place.
+
+    "bf16" works on CPU (fast on CPUs with AVX512-BF16/AMX) and recent GPUs,
+    "fp16" only on CUDA. LayerNorms keep fp32 weights and normalize in fp32;
+    callers cast inputs to the model dtype and outputs back to fp32.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(
+            f"Unknown precision {precision!r}, expected one of {list(PRECISIONS)}."
+        )
+
+    device = torch.device(device)
+    if precision == "fp16" and device.type != "cuda":
+        raise ValueError("fp16 inference needs CUDA; use bf16 on CPU.")
+    if (
+        precision == "bf16"
+        and device.type == "cuda"
+        and not torch.cuda.is_bf16_supported()
+    ):
+        raise ValueError("This GPU does not support bf16; use fp16.")
+
+    if precision == "fp32":
+        return model
+
+    # Swap the LayerNorms while their weights are still fp32, then cast
+    # everything else; `model.to(dtype)` would round the LayerNorms too
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, nn.LayerNorm) and not isinstance(child, FP32LayerNorm):
+                setattr(module, name, _to_fp32_layer_norm(child))
+
+    dtype = PRECISIONS[precision]
+    for module in model.modules():
+        if isinstance(module, FP32LayerNorm):
+            continue
+        for param in module.parameters(recurse=False):
+            if param.is_floating_point():
+                param.data = param.data.to(dtype)
+        for name, buffer in module.named_buffers(recurse=False):
+            if buffer.is_floating_point():
+                module._buffers[name] = buffer.to(dtype)
+
+    return model
@@ -0,0 +1,108 @@
+from typing import Iterable, List
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.ao.quantization import (
+    DeQuantStub,
+    QuantStub,
+    convert,
+    get_default_qconfig,
+    prepare,
+    quantize_dynamic,
+)
+
+from .depth_anything.dpt import DepthAnything
+
+# "none": fp32; "dynamic": int8 weights for the ViT linears, activations
+# quantized on the fly; "static": int8 ViT linears with activation ranges
+# calibrated on sample images
+QUANTIZATION_MODES = ("none", "dynamic", "static")
+
+
+class _StaticQuantWrapper(nn.Module):
+    """Runs one float module as a static int8 module: quantize -> op -> dequantize."""
+
+    def __init__(self, module: nn.Module):
+        super().__init__()
+        self.quant = QuantStub()
+        self.module = module
+        self.dequant = DeQuantStub()
+
+    def forward(self, x):
+        return self.dequant(self.module(self.quant(x)))
+
+
+def _wrap_static(root: nn.Module, types: tuple, qconfig) -> List[nn.Module]:
+    """Wrap every submodule of `types` under `root` for eager-mode static quantization."""
+    wrappers = []
+    for name, module in list(root.named_modules()):
+        for child_name, child in list(module.named_children()):
+            if type(child) in types:
+                wrapper = _StaticQuantWrapper(child)
+                wrapper.qconfig = qconfig
+                setattr(module, child_name, wrapper)
+                wrappers.append(wrapper)
+    return wrappers
+
+
+def quantize_model(
+    model: DepthAnything,
+    mode: str = "dynamic",
+    quantize_head: bool = False,
+    calibration_images: Iterable[np.ndarray] = (),
+    input_size: int = 518,
+    backend: str = "x86",
+) -> DepthAnything:
+    """
+    Int8 CPU inference for a DepthAnything model, in place.
+
+    The ViT linears (`Attention.qkv/proj`, `Mlp.fc1/fc2`) dominate CPU time;
+    `mode` "dynamic" stores their weights as int8 and quantizes activations
+    per call, "static" also fixes the activation ranges from
+    `calibration_images`. `quantize_head` additionally runs the DPT head
+    convolutions as static int8 (also calibrated). Each statically quantized
+    layer (de)quantizes its own input and output, so the rest of the network
+    stays fp32.
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(
+            f"Unknown quantization mode {mode!r}, expected one of {QUANTIZATION_MODES}."
+        )
+
+    if mode == "none" and not quantize_head:
+        return model
+
+    if model.pretrained.cls_token.device.type != "cpu":
+        raise ValueError("Int8 quantization is only supported for CPU inference.")
+
+    torch.backends.quantized.engine = "fbgemm" if backend == "x86" else backend
+    qconfig = get_default_qconfig(backend)
+
+    calibrated = []
+    if mode == "static":
+        _wrap_static(model.pretrained, (nn.Linear,), qconfig)
+        calibrated.append(model.pretrained)
+    if quantize_head:
+        _wrap_static(model.depth_head, (nn.Conv2d,), qconfig)
+        calibrated.append(model.depth_head)
+
+    if calibrated:
+        calibration_images = list(calibration_images)
+        if not calibration_images:
+            raise ValueError("Static quantization needs calibration images.")
+
+        for module in calibrated:
+            prepare(module, inplace=True)
+
+        with torch.no_grad():
+            for image in calibration_images:
+                model.infer_image(image, input_size)
+
+        for module in calibrated:
+            convert(module, inplace=True)
+
+    if mode == "dynamic":
+        quantize_dynamic(model.pretrained, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+    return model
@@ -0,0 +1,120 @@
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import cv2
+
+from .depth_anything.util.transform import Resize
+
+PATCH_SIZE = 14
+
+# "full": the model's native 518; "preview": a fast, coarse 252; "auto": the
+# requested size, but never more than the source image's shorter side
+RESOLUTION_MODES = ("full", "preview", "auto")
+DEFAULT_INPUT_SIZE = 518
+PREVIEW_INPUT_SIZE = 252
+
+MIN_INPUT_SIZE = 56
+MAX_INPUT_SIZE = 1036
+
+
+@lru_cache(maxsize=None)
+def _resizer(input_size: int) -> Resize:
+    # Same geometry as `ImagePreprocessor`
+    return Resize(
+        width=input_size,
+        height=input_size,
+        resize_target=False,
+        keep_aspect_ratio=True,
+        ensure_multiple_of=PATCH_SIZE,
+        resize_method="lower_bound",
+        image_interpolation_method=cv2.INTER_CUBIC,
+    )
+
+
+def network_shape(height: int, width: int, input_size: int) -> Tuple[int, int]:
+    """Network input (height, width) for an image at `input_size`."""
+    new_width, new_height = _resizer(input_size).get_size(width, height)
+    return int(new_height), int(new_width)
+
+
+def token_count(height: int, width: int, input_size: int) -> int:
+    """Patch tokens (patch_h * patch_w) the ViT sees for an image at `input_size`."""
+    net_h, net_w = network_shape(height, width, input_size)
+    return (net_h // PATCH_SIZE) * (net_w // PATCH_SIZE)
+
+
+@dataclass(frozen=True)
+class Resolution:
+    """The input size chosen for one image and what it costs."""
+
+    mode: str
+    input_size: int
+    shape: Tuple[int, int]
+    tokens: int
+
+    def as_dict(self) -> dict:
+        return {
+            "mode": self.mode,
+            "input_size": self.input_size,
+            "shape": list(self.shape),
+            "tokens": self.tokens,
+        }
+
+
+def check_input_size(input_size: int) -> int:
+    if input_size % PATCH_SIZE or not MIN_INPUT_SIZE <= input_size <= MAX_INPUT_SIZE:
+        raise ValueError(
+            f"input_size must be a multiple of {PATCH_SIZE} between "
+            f"{MIN_INPUT_SIZE} and {MAX_INPUT_SIZE}, got {input_size}."
+        )
+    return input_size
+
+
+def base_input_size(mode: str = "full", input_size: Optional[int] = None) -> int:
+    """
+    The largest input size `select_resolution` can pick for `mode`: an explicit
+    `input_size`, else 518, or 252 for "preview".
+    """
+    if mode not in RESOLUTION_MODES:
+        raise ValueError(
+            f"Unknown resolution mode {mode!r}, expected one of {RESOLUTION_MODES}."
+        )
+    if input_size is not None:
+        return check_input_size(input_size)
+    return PREVIEW_INPUT_SIZE if mode == "preview" else DEFAULT_INPUT_SIZE
+
+
+def select_resolution(
+    height: int,
+    width: int,
+    mode: str = "full",
+    input_size: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+) -> Resolution:
+    """
+    Input size for a `height` x `width` image.
+
+    Starts from `base_input_size(mode, input_size)`. "auto" lowers it to the
+    image's shorter side (rounded up to a multiple of 14), so thumbnails are
+    not upscaled. With `max_tokens`, the size then shrinks in steps of 14
+    until patch_h * patch_w fits the budget, down to MIN_INPUT_SIZE. Wide
+    panoramas otherwise turn into very long token sequences.
+    """
+    size = base_input_size(mode, input_size)
+
+    if mode == "auto":
+        shorter = math.ceil(min(height, width) / PATCH_SIZE) * PATCH_SIZE
+        size = min(size, max(shorter, MIN_INPUT_SIZE))
+
+    if max_tokens:
+        while size > MIN_INPUT_SIZE and token_count(height, width, size) > max_tokens:
+            size -= PATCH_SIZE
+
+    return Resolution(
+        mode=mode,
+        input_size=size,
+        shape=network_shape(height, width, size),
+        tokens=token_count(height, width, size),
+    )
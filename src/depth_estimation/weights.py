@@ -0,0 +1,63 @@
+import argparse
+from pathlib import Path
+from typing import Dict
+
+import torch
+
+
+def safetensors_path(checkpoint_path: str | Path) -> Path:
+    """The .safetensors file converted from (or standing in for) a checkpoint."""
+    return Path(checkpoint_path).with_suffix(".safetensors")
+
+
+def load_state_dict(checkpoint_path: str | Path) -> Dict[str, torch.Tensor]:
+    """
+    Memory-mapped state dict for a checkpoint.
+
+    Prefers the converted .safetensors file next to `checkpoint_path`. Its
+    tensors are backed by a copy-on-write mapping of the file, so the read-only
+    weight pages are shared by every worker process through the page cache.
+    Falls back to `torch.load(mmap=True)` on the .pth itself.
+    """
+    converted = safetensors_path(checkpoint_path)
+    if converted.exists():
+        try:
+            from safetensors.torch import load_file
+        except ImportError:
+            pass
+        else:
+            return load_file(converted, device="cpu")
+
+    return torch.load(checkpoint_path, map_location="cpu", weights_only=True, mmap=True)
+
+
+def convert_to_safetensors(
+    checkpoint_path: str | Path, output_path: str | Path | None = None
+) -> Path:
+    """Write a .pth state dict as .safetensors (next to it by default)."""
+    from safetensors.torch import save_file
+
+    output_path = Path(output_path) if output_path else safetensors_path(checkpoint_path)
+
+    state_dict = torch.load(checkpoint_path, map_location="cpu", weights_only=True)
+    # safetensors refuses shared or non-contiguous storage
+    state_dict = {k: v.contiguous().clone() for k, v in state_dict.items()}
+
+    save_file(state_dict, output_path)
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert Depth Anything .pth checkpoints to safetensors."
+    )
+    parser.add_argument("checkpoints", nargs="+", type=Path)
+    args = parser.parse_args()
+
+    for checkpoint in args.checkpoints:
+        output = convert_to_safetensors(checkpoint)
+        print(f"{checkpoint} -> {output}")
+
+
+if __name__ == "__main__":
+    main()